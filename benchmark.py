@@ -0,0 +1,343 @@
+"""Benchmarks for the contact manager's hot paths
+
+Generates synthetic address books of several sizes and times loading,
+saving, adding, searching and refreshing the list without opening a
+window (the Treeview is replaced by a small stand-in), as well as a cold
+start of the command-line mode. Results can be
+written as JSON or CSV and compared with an earlier run:
+
+    python benchmark.py --sizes 1000 10000 100000 --output bench.json
+    python benchmark.py --baseline bench.json
+"""
+import argparse
+import csv
+import json
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+from records import Contact
+from search_index import SearchIndex
+from sort_index import SORT_KEYS, SortedIndex
+from storage import BinaryStorage, JournalStorage, JsonStorage, SqliteStorage, convert_to_binary
+from store import ContactStore
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+# A result this much slower than the baseline counts as a regression
+DEFAULT_THRESHOLD = 1.25
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda",
+               "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+               "Thomas", "Sarah", "Charles", "Karen", "Priya", "Arjun", "Wei", "Yuki", "Fatima"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+              "Rodriguez", "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Thomas",
+              "Taylor", "Moore", "Jackson", "Martin", "Lee", "Sengupta", "Roy", "Chen", "Sato"]
+STREETS = ["Main St", "Oak Ave", "Park Rd", "Lake View", "Hill St", "Station Rd", "Elm St"]
+DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "example.org", "company.co"]
+
+# Typing sequences replayed for each search mode
+SEARCH_SEQUENCES = {"name": "sengu", "phone": "55501", "all": "oak a"}
+
+
+def generate_contacts(size, seed=42):
+    """Deterministic synthetic contacts with unique phone numbers"""
+    rng = random.Random(seed)
+    contacts = []
+    for i in range(size):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        day = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00"
+        contacts.append({
+            "id": i + 1,
+            "name": f"{first} {last}",
+            "phone": f"555-{i // 10000:03d}-{i % 10000:04d}",
+            "email": f"{first.lower()}.{last.lower()}{i}@{rng.choice(DOMAINS)}" if rng.random() < 0.8 else "",
+            "address": f"{rng.randint(1, 999)} {rng.choice(STREETS)}" if rng.random() < 0.6 else "",
+            "date_added": day,
+            "date_modified": day
+        })
+    return contacts
+
+
+def timed(fn, repeat):
+    """Run ``fn`` ``repeat`` times and return the individual timings"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+class StubTree:
+    """Just enough of ttk.Treeview for VirtualTreeview to render into"""
+
+    def __init__(self):
+        self.items = []
+        self.values = {}
+
+    def get_children(self):
+        return tuple(self.items)
+
+    def insert(self, parent, index, iid, values):
+        self.items.insert(index, iid)
+        self.values[iid] = values
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.items.remove(iid)
+            del self.values[iid]
+
+    def index(self, iid):
+        return self.items.index(iid)
+
+    def move(self, iid, parent, index):
+        self.items.remove(iid)
+        self.items.insert(index, iid)
+
+    def item(self, iid, values):
+        self.values[iid] = values
+
+    def selection(self):
+        return ()
+
+    def selection_set(self, iid):
+        pass
+
+
+class StubScrollbar:
+    def set(self, first, last):
+        pass
+
+
+def headless_app(store, storage, search_index, sort_index):
+    """Object with the attributes ContactManager's data methods rely on"""
+    from gui import ContactManager
+    from virtual_list import VirtualTreeview
+
+    contact_list = VirtualTreeview.__new__(VirtualTreeview)
+    contact_list.row_values = lambda contact: ContactManager.contact_row_values(None, contact)
+    contact_list.row_key = lambda contact: contact.id
+    contact_list.rows = []
+    contact_list.offset = 0
+    contact_list.page_size = 19
+    contact_list._shown = {}
+    contact_list._selected = None
+    contact_list.tree = StubTree()
+    contact_list.v_scrollbar = StubScrollbar()
+
+    app = SimpleNamespace(store=store, storage=storage, search_index=search_index,
+                          sort_index=sort_index, contact_list=contact_list)
+
+    def refresh(search_term="", search_option="name", sort_column="name", sort_reverse=False):
+        rows = ContactManager.filter_contacts(app, search_term, search_option, sort_column, sort_reverse)
+        contact_list.set_rows(rows)
+        return rows
+
+    app.refresh = refresh
+    return app
+
+
+def bench_size(size, repeat, workdir):
+    """Time every operation for one address book size"""
+    results = []
+
+    def record(op, timings, per=1):
+        results.append({
+            "op": op,
+            "size": size,
+            "median": statistics.median(timings) / per,
+            "min": min(timings) / per,
+            "repeat": len(timings),
+        })
+
+    contacts = generate_contacts(size)
+    json_path = workdir / f"contacts_{size}.json"
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(contacts, f, indent=2, ensure_ascii=False)
+
+    # Cold start of the command-line mode: a fresh interpreter, no tkinter
+    command = [sys.executable, str(Path(__file__).with_name("app.py")), "list",
+               "--file", str(json_path), "--storage", "json", "--limit", "1"]
+    record("cli_list", timed(lambda: subprocess.run(command, stdout=subprocess.DEVNULL, check=True),
+                             repeat))
+
+    # Memory held by a loaded store (reported in bytes per contact)
+    json_storage = JsonStorage(json_path)
+    loaded = json_storage.load()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = ContactStore(loaded)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del loaded
+    results.append({"op": "memory_per_contact", "size": size, "median": used / size,
+                    "min": used / size, "repeat": 1})
+
+    # Loading
+    record("load_json", timed(lambda: ContactStore(json_storage.load()), repeat))
+
+    journal_storage = JournalStorage(json_path)
+    store = ContactStore(journal_storage.load())
+    for contact in list(store.active_contacts())[:max(1, size // 10)]:
+        store.update(contact, contact.name + " Jr", contact.phone, contact.email, contact.address)
+    journal_storage.save(store)
+    record("load_journal", timed(lambda: ContactStore(journal_storage.load(), journal_storage.next_id), repeat))
+    journal_storage.journal_path.unlink()
+
+    sqlite_storage = SqliteStorage(workdir / f"contacts_{size}.db")
+    sqlite_storage.write_all([Contact.from_dict(c) for c in contacts], size + 1)
+    record("load_sqlite", timed(lambda: ContactStore(sqlite_storage.load()), repeat))
+
+    binary_storage = BinaryStorage(workdir / f"contacts_{size}.bin")
+    convert_to_binary(json_path, binary_storage.path)
+    record("load_binary", timed(lambda: ContactStore(binary_storage.load(), binary_storage.next_id),
+                                repeat))
+
+    # What the window shows before a binary load has finished
+    def first_screen():
+        preview = binary_storage.preview()
+        preview[0:30]
+        preview.close()
+    record("first_screen_binary", timed(first_screen, repeat))
+
+    # Saving a single edit
+    def edit_one(storage):
+        store = ContactStore(storage.load(), storage.next_id)
+        contact = store.get(size // 2)
+
+        def save():
+            store.update(contact, contact.name, contact.phone, contact.email, contact.address)
+            storage.save(store)
+        return save
+
+    record("save_json", timed(edit_one(json_storage), repeat))
+    record("save_journal", timed(edit_one(journal_storage), repeat))
+    record("save_sqlite", timed(edit_one(sqlite_storage), repeat))
+    journal_storage.journal_path.unlink()
+
+    # Adding: duplicate check plus insert, with the search and sort indexes following along
+    store = ContactStore(contacts)
+    SearchIndex(store)
+    SortedIndex(store).ordered()
+    batch = 1000
+    counter = iter(range(10 ** 9))
+
+    def add_batch():
+        for _ in range(batch):
+            phone = f"999-{next(counter):09d}"
+            if not store.phone_exists(phone):
+                store.add("New Contact", phone, "", "")
+    record("add", timed(add_batch, repeat), per=batch)
+
+    # Searching, one keystroke at a time
+    store = ContactStore(contacts)
+    index = SearchIndex(store)
+    record("build_index", timed(index.rebuild, repeat))
+    for option, sequence in SEARCH_SEQUENCES.items():
+        def type_sequence(option=option, sequence=sequence):
+            index.rebuild()
+            for i in range(1, len(sequence) + 1):
+                index.search(sequence[:i], option)
+        record(f"search_{option}", timed(type_sequence, repeat), per=len(sequence))
+
+        def type_sql(option=option, sequence=sequence):
+            for i in range(1, len(sequence) + 1):
+                sqlite_storage.search(sequence[:i], option)
+        record(f"search_sqlite_{option}", timed(type_sql, repeat), per=len(sequence))
+
+    # Refreshing the list: filter, sort and render the visible window
+    sort_index = SortedIndex(store)
+    app = headless_app(store, json_storage, index, sort_index)
+    record("refresh_all", timed(app.refresh, repeat))
+    record("refresh_search", timed(lambda: app.refresh("smith", "name"), repeat))
+    for column in SORT_KEYS:
+        record(f"refresh_sort_{column}", timed(lambda c=column: app.refresh("", "name", c, True), repeat))
+
+    sqlite_storage.conn.close()
+    return results
+
+
+def format_value(result, key="median"):
+    """Timings in milliseconds, memory in bytes"""
+    if result["op"].startswith("memory"):
+        return f"{result[key]:10.0f} B "
+    return f"{result[key] * 1000:10.3f} ms"
+
+
+def compare(results, baseline, threshold):
+    """Print each result next to its baseline; return the regressions"""
+    previous = {(r["op"], r["size"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["op"], result["size"]))
+        if not before or not before["median"]:
+            continue
+        ratio = result["median"] / before["median"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"{result['op']:<22}{result['size']:>9}  {format_value(before)} "
+              f"-> {format_value(result)}  x{ratio:5.2f}  {flag}")
+        if flag:
+            regressions.append(result)
+    return regressions
+
+
+def write_report(results, path):
+    """Write results as JSON, or CSV when the file name ends in .csv"""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=["op", "size", "median", "min", "repeat"])
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+def read_report(path):
+    """Read results written by ``write_report``"""
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.suffix.lower() == ".csv":
+            return [{"op": r["op"], "size": int(r["size"]), "median": float(r["median"]),
+                     "min": float(r["min"]), "repeat": int(r["repeat"])} for r in csv.DictReader(f)]
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the contact manager's hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="address book sizes to generate (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per operation")
+    parser.add_argument("--output", help="write results to this .json or .csv file")
+    parser.add_argument("--baseline", help="compare against results from an earlier run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown ratio reported as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            size_results = bench_size(size, args.repeat, Path(tmp))
+            for result in size_results:
+                print(f"{result['op']:<22}{size:>9}  {format_value(result)}")
+            results.extend(size_results)
+
+    if args.output:
+        write_report(results, args.output)
+    if args.baseline:
+        print(f"\nCompared with {args.baseline}:")
+        if compare(results, read_report(args.baseline), args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""Compact binary snapshot of the contact list
+
+Layout (all integers little-endian)::
+
+    header        magic "CMBS", version, flags, count, active, next_id, reserved
+    offsets       count + 1 uint64: where each record starts; the last one
+                  is the end of the file
+    name order    active uint32: record numbers of the active contacts
+                  sorted like the Name column (lowercased name, then id)
+    records       per contact a fixed part (id, packed dates, flags, uid
+                  and the byte length of each text), then the texts as UTF-8
+
+The file is memory-mapped when opened and nothing is decoded up front.
+``SnapshotReader.contact(i)`` decodes a single record through the offset
+table, so the first screen of the name-sorted list can be shown after
+reading a few dozen records. ``contacts()`` decodes everything in one
+sequential pass for a full load.
+
+Dates that aren't in the packed form, the version of a contact that was
+changed, and keys the app doesn't know about go into a small JSON blob
+per record so nothing is lost on the round trip to and from contacts.json.
+
+Version 1 files, whose records have no uid, are still read.
+"""
+import gc
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from records import Contact
+
+MAGIC = b"CMBS"
+# 2: records carry the contact's uid
+VERSION = 2
+
+HEADER = struct.Struct("<4sHHIIII")
+# id, added, modified, flags, uid, then lengths of name, phone, email, address, extra
+RECORD = struct.Struct("<IqqBQIIIII")
+# The same without the uid
+RECORD_V1 = struct.Struct("<IqqBIIIII")
+OFFSET = struct.Struct("<Q")
+ORDER = struct.Struct("<I")
+
+DELETED = 1
+HAS_MODIFIED = 2
+# The dates are in the extra blob as they appeared in the JSON
+RAW_DATES = 4
+# The contact's version is in the extra blob (it is 0 otherwise)
+VERSIONED = 8
+
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_record(contact):
+    """Bytes of one record"""
+    added, modified, extra = contact.added, contact.modified, contact.extra
+    flags = DELETED if contact.deleted else 0
+    if isinstance(added, int) and (modified is None or isinstance(modified, int)):
+        if modified is not None:
+            flags |= HAS_MODIFIED
+        else:
+            modified = 0
+    else:
+        flags |= RAW_DATES
+        extra = dict(extra or {}, date_added=added, date_modified=modified)
+        added = modified = 0
+    if contact.version:
+        flags |= VERSIONED
+        extra = dict(extra or {}, version=contact.version)
+
+    texts = [contact.name.encode("utf-8"), contact.phone.encode("utf-8"),
+             contact.email.encode("utf-8"), contact.address.encode("utf-8"),
+             json.dumps(extra, ensure_ascii=False).encode("utf-8") if extra else b""]
+    return RECORD.pack(contact.id, added, modified, flags, contact.uid,
+                       *map(len, texts)) + b"".join(texts)
+
+
+def encode_snapshot(contacts, next_id):
+    """The whole snapshot file for a list of Contact records"""
+    records = [encode_record(c) for c in contacts]
+    active = [i for i, c in enumerate(contacts) if not c.deleted]
+    active.sort(key=lambda i: (contacts[i].name.lower(), contacts[i].id))
+
+    position = HEADER.size + OFFSET.size * (len(records) + 1) + ORDER.size * len(active)
+    offsets = array("Q")
+    for record in records:
+        offsets.append(position)
+        position += len(record)
+    offsets.append(position)
+
+    header = HEADER.pack(MAGIC, VERSION, 0, len(records), len(active), next_id, 0)
+    return b"".join([header, _little_endian(offsets), _little_endian(array("I", active))]
+                    + records)
+
+
+class SnapshotReader:
+    """Memory-mapped snapshot file that decodes records on demand"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, _, self.count, self.active, self.next_id, _ = HEADER.unpack_from(self._data)
+        except (ValueError, struct.error):
+            self.close()
+            raise ValueError(f"{path} is not a contact snapshot")
+        if magic != MAGIC or not 1 <= version <= VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a contact snapshot (or from a newer version)")
+        self._with_uids = version >= 2
+        self._order_start = HEADER.size + OFFSET.size * (self.count + 1)
+
+    def fileno(self):
+        return self._file.fileno()
+
+    @property
+    def size(self):
+        return len(self._data)
+
+    def close(self):
+        data = getattr(self, "_data", None)
+        if data is not None:
+            data.close()
+            self._data = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def contact(self, index):
+        """Decode record number ``index``"""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self._decode(OFFSET.unpack_from(self._data, HEADER.size + OFFSET.size * index)[0])[0]
+
+    def contacts(self):
+        """Decode every record, in file order"""
+        result = []
+        append = result.append
+        decode = self._decode
+        position = OFFSET.unpack_from(self._data, HEADER.size)[0]
+        # Like ContactStore.load: don't let the collector rescan new records
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(self.count):
+                contact, position = decode(position)
+                append(contact)
+        finally:
+            if collecting:
+                gc.enable()
+        return result
+
+    def __iter__(self):
+        """Decode the records one at a time, in file order"""
+        position = OFFSET.unpack_from(self._data, HEADER.size)[0]
+        for _ in range(self.count):
+            contact, position = self._decode(position)
+            yield contact
+
+    def by_name(self):
+        """Active contacts in Name column order, decoded as they are looked at"""
+        return NameOrder(self)
+
+    def name_order_index(self, position):
+        return ORDER.unpack_from(self._data, self._order_start + ORDER.size * position)[0]
+
+    def _decode(self, position):
+        data = self._data
+        if self._with_uids:
+            contact_id, added, modified, flags, uid, name, phone, email, address, extra = \
+                RECORD.unpack_from(data, position)
+            position += RECORD.size
+        else:
+            contact_id, added, modified, flags, name, phone, email, address, extra = \
+                RECORD_V1.unpack_from(data, position)
+            uid = 0
+            position += RECORD_V1.size
+        # The lengths become end positions of each text
+        name += position
+        phone += name
+        email += phone
+        address += email
+        extra += address
+
+        contact = Contact.__new__(Contact)
+        contact.id = contact_id
+        contact.name = sys.intern(str(data[position:name], "utf-8"))
+        contact.phone = str(data[name:phone], "utf-8")
+        contact.email = str(data[phone:email], "utf-8")
+        contact.address = sys.intern(str(data[email:address], "utf-8"))
+        contact.added = added
+        contact.modified = modified if flags & HAS_MODIFIED else None
+        contact.deleted = bool(flags & DELETED)
+        contact.extra = json.loads(data[address:extra]) if extra > address else None
+        contact.version = 0
+        contact.uid = uid
+        if flags & (RAW_DATES | VERSIONED):
+            if flags & RAW_DATES:
+                contact.added = contact.extra.pop("date_added")
+                contact.modified = contact.extra.pop("date_modified")
+            if flags & VERSIONED:
+                contact.version = contact.extra.pop("version")
+            contact.extra = contact.extra or None
+        return contact, extra
+
+
+class NameOrder:
+    """Read-only sequence over a snapshot's name order; decodes on access
+
+    Slicing it (as the contact list does for the visible rows) only
+    decodes the records in the slice. Decoded contacts are kept, so
+    scrolling back and forth doesn't decode them again.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self._decoded = {}
+
+    def __len__(self):
+        return self.reader.active
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        contact = self._decoded.get(index)
+        if contact is None:
+            contact = self.reader.contact(self.reader.name_order_index(index))
+            self._decoded[index] = contact
+        return contact
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        self.reader.close()
@@ -0,0 +1,457 @@
+"""Command-line interface for scripted use, without a display
+
+    python app.py add NAME PHONE [--email E] [--address A]
+    python app.py list [--sort name|phone|email|added] [--reverse] [--limit N]
+    python app.py search TERM [--by name|phone|all] [--sort ...] [--limit N]
+    python app.py export FILE [--format text|csv|jsonl|vcard]
+    python app.py import FILE [--format csv|jsonl|vcard] [--report FILE]
+    python app.py compact
+    python app.py stats [--top N]
+    python app.py duplicates [--threshold 0.8] [--limit N]
+    python app.py validate [--fix] [--workers N] [--limit N]
+    python app.py convert SOURCE TARGET   (contacts.json <-> contacts.bin)
+    python app.py sync OTHER              (take newer contacts from another copy)
+    python app.py sync-fingerprint FILE
+    python app.py sync-diff FINGERPRINTS CHANGESET
+    python app.py sync-apply CHANGESET
+    python app.py serve [--host 127.0.0.1] [--port 8765]
+
+Every command takes --file (default: the GUI's contacts.json) and
+--storage. With --json, contacts and summaries are printed as one JSON
+object per line so the output can be piped into other tools.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import metrics
+from storage import default_data_file, open_storage
+from store import ContactStore
+from validation import contact_error
+
+
+class CommandError(Exception):
+    """A command failed in a way worth a one-line message and exit code 1"""
+
+
+class Session:
+    """The data file opened for one command
+
+    Commands that change contacts hold the storage lock from load to save
+    so they can't interleave with a running GUI or another command.
+    """
+
+    def __init__(self, path, mode=None, write=False):
+        path = Path(path)
+        if not path.exists():
+            path.write_text("[]", encoding="utf-8")
+        self.storage = open_storage(path, mode)
+        self.write = write
+        self.storage.lock.acquire()
+        try:
+            self.store = ContactStore(self.storage.load(), next_id=self.storage.next_id)
+        except Exception:
+            self.storage.lock.release()
+            raise
+        if not write:
+            self.storage.lock.release()
+
+    def save(self):
+        self.storage.save(self.store)
+
+    def close(self):
+        if self.write:
+            self.storage.lock.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ordered(self, term="", option="name", column="name", reverse=False):
+        """Active contacts matching ``term``, in the order the GUI would show them"""
+        from sort_index import SortedIndex
+
+        ids = None
+        if term:
+            if self.storage.supports_search:
+                ids = self.storage.search(term, option)
+            else:
+                from search_index import SearchIndex
+                ids = SearchIndex(self.store).search(term, option)
+        return self.store.get_many(SortedIndex(self.store).ordered(ids, column, reverse))
+
+
+class Output:
+    """Prints contacts and messages as text or newline-delimited JSON"""
+
+    def __init__(self, as_json, stream=None):
+        self.as_json = as_json
+        self.stream = stream or sys.stdout
+
+    def contact(self, contact):
+        if self.as_json:
+            self.stream.write(json.dumps(contact.to_dict(), ensure_ascii=False) + "\n")
+        else:
+            fields = [str(contact.id), contact.name, contact.phone, contact.email, contact.address]
+            self.stream.write("\t".join(fields).rstrip("\t") + "\n")
+
+    def contacts(self, contacts):
+        for contact in contacts:
+            self.contact(contact)
+
+    def result(self, message, **fields):
+        """A summary line; ``fields`` become the JSON object"""
+        if self.as_json:
+            self.stream.write(json.dumps(fields, ensure_ascii=False) + "\n")
+        else:
+            self.stream.write(message + "\n")
+
+
+def cmd_add(args, out):
+    name = args.name.strip()
+    phone = args.phone.strip()
+    email = (args.email or "").strip()
+    address = (args.address or "").strip()
+    error = contact_error(name, phone, email)
+    if error:
+        raise CommandError(error)
+
+    with Session(args.file, args.storage, write=True) as session:
+        if session.store.phone_exists(phone):
+            raise CommandError("A contact with this phone number already exists")
+        contact = session.store.add(name, phone, email, address)
+        session.save()
+    out.contact(contact)
+
+
+def cmd_list(args, out):
+    with Session(args.file, args.storage) as session:
+        contacts = session.ordered(column=args.sort, reverse=args.reverse)
+    out.contacts(contacts[:args.limit] if args.limit else contacts)
+
+
+def cmd_search(args, out):
+    with Session(args.file, args.storage) as session:
+        contacts = session.ordered(args.term.lower(), args.by, args.sort, args.reverse)
+    out.contacts(contacts[:args.limit] if args.limit else contacts)
+
+
+def cmd_export(args, out):
+    from exporters import export_contacts, format_for_path
+
+    with Session(args.file, args.storage) as session:
+        contacts = session.ordered(column=args.sort, reverse=args.reverse)
+    count = export_contacts(iter(contacts), args.output, args.format or format_for_path(args.output))
+    out.result(f"{count} contacts exported to {args.output}", exported=count, path=str(args.output))
+
+
+def cmd_import(args, out):
+    from importers import commit_import, format_for_path, prepare_import
+
+    path = Path(args.input)
+    try:
+        fmt = args.format or format_for_path(path)
+    except ValueError as e:
+        raise CommandError(str(e))
+
+    with Session(args.file, args.storage, write=True) as session:
+        accepted, report = prepare_import(session.store, path, fmt)
+        commit_import(session.store, accepted, report)
+        session.save()
+
+    report_file = None
+    if report.rejected:
+        report_file = Path(args.report) if args.report else path.with_name(path.stem + "_rejected.csv")
+        report.write(report_file)
+    message = f"Imported {report.added} of {report.rows} contacts"
+    if report_file:
+        message += f"; {len(report.rejected)} rows rejected, see {report_file}"
+    out.result(message, rows=report.rows, added=report.added, rejected=len(report.rejected),
+               report=str(report_file) if report_file else None)
+
+
+def cmd_compact(args, out):
+    with Session(args.file, args.storage, write=True) as session:
+        before = len(session.store.contacts)
+        session.storage.compact(session.store)
+        removed = before - len(session.store.contacts)
+    out.result(f"Removed {removed} deleted contacts", removed=removed)
+
+
+def cmd_duplicates(args, out):
+    from duplicates import find_duplicates
+
+    with Session(args.file, args.storage) as session:
+        store = session.store
+        pairs = find_duplicates(store.active_contacts(), args.threshold)
+        for pair in pairs[:args.limit] if args.limit else pairs:
+            first, second = store.get(pair.first_id), store.get(pair.second_id)
+            out.result(f"{pair.score:.2f}\t{first.id}\t{first.name}\t{second.id}\t{second.name}"
+                       f"\t{', '.join(pair.reasons)}",
+                       score=round(pair.score, 3), first=first.to_dict(), second=second.to_dict(),
+                       reasons=pair.reasons)
+
+
+def cmd_validate(args, out):
+    from validation import validate_records
+
+    with Session(args.file, args.storage, write=args.fix) as session:
+        store = session.store
+        contacts = list(store.active_contacts())
+        problems = fixed = 0
+        for result in validate_records(contacts, args.workers):
+            contact = contacts[result.index]
+            if result.errors:
+                problems += 1
+                if not args.limit or problems <= args.limit:
+                    out.result(f"{contact.id}\t{contact.name}\t{'; '.join(result.errors)}",
+                               id=contact.id, name=contact.name, errors=list(result.errors))
+            # Phones are left as typed; only their digits are compared anywhere
+            if args.fix and (result.name, result.email, result.address) != \
+                    (contact.name, contact.email, contact.address):
+                store.update(contact, result.name, contact.phone, result.email, result.address)
+                fixed += 1
+        if fixed:
+            session.save()
+    message = f"{problems} of {len(contacts)} contacts have problems"
+    if args.fix:
+        message += f"; {fixed} normalized"
+    out.result(message, checked=len(contacts), problems=problems, normalized=fixed)
+
+
+def cmd_stats(args, out):
+    from contact_stats import ContactStats
+
+    with Session(args.file, args.storage) as session:
+        stats = ContactStats(session.store)
+        summary = stats.summary(args.top)
+    if out.as_json:
+        out.result("", **summary)
+        return
+    lines = [f"Active contacts: {summary['active']}",
+             f"Deleted contacts: {summary['deleted']}",
+             f"Without email: {summary['missing_email']}",
+             f"Without address: {summary['missing_address']}",
+             "Added per month:"]
+    lines += [f"  {month}\t{count}" for month, count in summary['added_per_month'].items()]
+    lines.append("Top email domains:")
+    lines += [f"  {domain}\t{count}" for domain, count in summary['top_domains'].items()]
+    out.result("\n".join(lines))
+
+
+def cmd_convert(args, out):
+    from storage import convert_to_binary, convert_to_json
+
+    source, target = Path(args.source), Path(args.target)
+    if not source.exists():
+        raise CommandError(f"{source} does not exist")
+    if source.suffix.lower() == ".bin" and target.suffix.lower() == ".json":
+        count = convert_to_json(source, target)
+    elif source.suffix.lower() == ".json" and target.suffix.lower() == ".bin":
+        count = convert_to_binary(source, target)
+    else:
+        raise CommandError("Convert from .json to .bin or from .bin to .json")
+    out.result(f"{count} contacts written to {target}", converted=count, path=str(target))
+
+
+def stream_contacts(path, mode=None):
+    """Every contact stored at ``path``, read as a stream under the storage lock"""
+    storage = open_storage(path, mode)
+    storage.lock.acquire()
+    try:
+        yield from storage.iter_contacts()
+    finally:
+        storage.lock.release()
+
+
+def sync_result(out, report):
+    out.result(report.summary(), added=report.added, updated=report.updated,
+               deleted=report.deleted, unchanged=report.unchanged,
+               renumbered=report.renumbered)
+
+
+def cmd_sync(args, out):
+    from sync import apply_changes
+
+    source = Path(args.source)
+    if not source.exists():
+        raise CommandError(f"{source} does not exist")
+    if source.resolve() == Path(args.file).resolve():
+        raise CommandError("Can't sync a file with itself")
+    with Session(args.file, args.storage, write=True) as session:
+        report = apply_changes(session.store, stream_contacts(source))
+        session.save()
+    sync_result(out, report)
+
+
+def cmd_sync_fingerprint(args, out):
+    from sync import Fingerprints
+
+    fingerprints = Fingerprints.build(stream_contacts(args.file, args.storage))
+    size = fingerprints.save(args.output)
+    out.result(f"{len(fingerprints)} contacts fingerprinted in {args.output} ({size} bytes)",
+               contacts=len(fingerprints), path=str(args.output), bytes=size)
+
+
+def cmd_sync_diff(args, out):
+    from sync import Fingerprints, diff, write_changeset
+
+    fingerprints = Fingerprints.load(args.fingerprints)
+    counts = write_changeset(args.output, diff(stream_contacts(args.file, args.storage), fingerprints))
+    out.result(f"{counts['add']} added, {counts['update']} updated, {counts['delete']} deleted "
+               f"contacts written to {args.output}", path=str(args.output), **counts)
+
+
+def cmd_sync_apply(args, out):
+    from sync import apply_changes, read_changeset
+
+    with Session(args.file, args.storage, write=True) as session:
+        report = apply_changes(session.store, read_changeset(args.changeset))
+        session.save()
+    sync_result(out, report)
+
+
+def cmd_serve(args, out):
+    import asyncio
+    import server
+
+    def ready(listener):
+        host, port = listener.sockets[0].getsockname()[:2]
+        out.result(f"Serving {args.file} on http://{host}:{port}/contacts (Ctrl+C to stop)",
+                   host=host, port=port)
+        out.stream.flush()
+
+    try:
+        asyncio.run(server.serve(args.file, args.storage, args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--file", default=str(default_data_file()),
+                        help="contacts file (default: %(default)s)")
+    common.add_argument("--storage", choices=["json", "journal", "sqlite", "binary"],
+                        help="storage mode (default: CONTACT_MANAGER_STORAGE or what's on disk)")
+    common.add_argument("--json", action="store_true",
+                        help="print one JSON object per line")
+
+    sorting = argparse.ArgumentParser(add_help=False)
+    sorting.add_argument("--sort", choices=["name", "phone", "email", "added"], default="name")
+    sorting.add_argument("--reverse", action="store_true")
+
+    parser = argparse.ArgumentParser(prog="app.py", description="Contact Manager without the window")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", parents=[common], help="add a contact")
+    add.add_argument("name")
+    add.add_argument("phone")
+    add.add_argument("--email")
+    add.add_argument("--address")
+    add.set_defaults(run=cmd_add)
+
+    listing = commands.add_parser("list", parents=[common, sorting], help="list contacts")
+    listing.add_argument("--limit", type=int)
+    listing.set_defaults(run=cmd_list)
+
+    search = commands.add_parser("search", parents=[common, sorting], help="search contacts")
+    search.add_argument("term")
+    search.add_argument("--by", choices=["name", "phone", "all"], default="name")
+    search.add_argument("--limit", type=int)
+    search.set_defaults(run=cmd_search)
+
+    export = commands.add_parser("export", parents=[common, sorting], help="export contacts")
+    export.add_argument("output")
+    export.add_argument("--format", choices=["text", "csv", "jsonl", "vcard"])
+    export.set_defaults(run=cmd_export)
+
+    importing = commands.add_parser("import", parents=[common], help="import contacts")
+    importing.add_argument("input")
+    importing.add_argument("--format", choices=["csv", "jsonl", "vcard"])
+    importing.add_argument("--report", help="where to write rejected rows")
+    importing.set_defaults(run=cmd_import)
+
+    compact = commands.add_parser("compact", parents=[common], help="drop deleted contacts for good")
+    compact.set_defaults(run=cmd_compact)
+
+    dupes = commands.add_parser("duplicates", parents=[common], help="list likely duplicate contacts")
+    dupes.add_argument("--threshold", type=float, default=0.8,
+                       help="lowest score to report, 0 to 1 (default: %(default)s)")
+    dupes.add_argument("--limit", type=int)
+    dupes.set_defaults(run=cmd_duplicates)
+
+    validate = commands.add_parser("validate", parents=[common],
+                                   help="check every contact against the current rules")
+    validate.add_argument("--fix", action="store_true",
+                          help="save names, emails and addresses with whitespace and case normalized")
+    validate.add_argument("--workers", type=int, default=None,
+                          help="processes to use (default: one per CPU for large files)")
+    validate.add_argument("--limit", type=int, help="show at most N problems")
+    validate.set_defaults(run=cmd_validate)
+
+    stats = commands.add_parser("stats", parents=[common], help="show totals and breakdowns")
+    stats.add_argument("--top", type=int, default=10, help="how many email domains to show")
+    stats.set_defaults(run=cmd_stats)
+
+    convert = commands.add_parser("convert", help="convert between contacts.json and a binary snapshot")
+    convert.add_argument("source")
+    convert.add_argument("target")
+    convert.add_argument("--json", action="store_true", help="print the summary as JSON")
+    convert.set_defaults(run=cmd_convert)
+
+    sync = commands.add_parser("sync", parents=[common], help="take newer contacts from another copy")
+    sync.add_argument("source", help="the other copy's contacts file")
+    sync.set_defaults(run=cmd_sync)
+
+    fingerprint = commands.add_parser("sync-fingerprint", parents=[common],
+                                      help="write fingerprints for another copy to diff against")
+    fingerprint.add_argument("output")
+    fingerprint.set_defaults(run=cmd_sync_fingerprint)
+
+    sync_diff = commands.add_parser("sync-diff", parents=[common],
+                                    help="write the contacts another copy is missing as a changeset")
+    sync_diff.add_argument("fingerprints", help="written by sync-fingerprint on the other copy")
+    sync_diff.add_argument("output", help="changeset file (gzipped if it ends in .gz)")
+    sync_diff.set_defaults(run=cmd_sync_diff)
+
+    sync_apply = commands.add_parser("sync-apply", parents=[common], help="apply a changeset")
+    sync_apply.add_argument("changeset")
+    sync_apply.set_defaults(run=cmd_sync_apply)
+
+    serve = commands.add_parser("serve", parents=[common], help="serve contacts over local HTTP")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.set_defaults(run=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    out = Output(args.json)
+    if metrics.PROFILE_PATH:
+        metrics.start_profile()
+    try:
+        args.run(args, out)
+    except CommandError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); that's fine, but keep
+        # Python from complaining when it flushes stdout on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if metrics.PROFILE_PATH:
+            metrics.stop_profile(metrics.PROFILE_PATH)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import sys
+from collections import Counter
+
+
+def unpack_day(day):
+    """Format a packed day such as 20240131 as 2024-01-31"""
+    return f"{day // 10000:04d}-{day // 100 % 100:02d}-{day % 100:02d}"
+
+
+def unpack_month(month):
+    """Format a packed month such as 202401 as 2024-01"""
+    return f"{month // 100:04d}-{month % 100:02d}"
+
+
+def _facts(contact):
+    """What a contact adds to the aggregates: (day added, email domain, flags)"""
+    added = contact.added
+    day = added // 10000 if isinstance(added, int) else None
+    email = contact.email
+    domain = sys.intern(email.rpartition("@")[2].lower()) if "@" in email else None
+    flags = (0 if email else 1) | (0 if contact.address.strip() else 2)
+    return day, domain, flags
+
+
+class ContactStats:
+    """Aggregates over the active contacts, kept up to date as they change
+
+    Active and deleted totals come straight from the store's counters.
+    Contacts added per day and month, contacts per email domain and the
+    number missing an email or address are counters that every store
+    event adjusts by one contact, so no change or lookup rescans the list.
+    Each contact's contribution is remembered by id, since the store
+    changes a contact in place before telling its listeners.
+
+    Like a SortedIndex column, the counters are only built the first time
+    they are asked for. ``version`` goes up on every change so a panel can
+    tell whether it needs redrawing.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.version = 0
+        self._facts = None
+        store.subscribe(self._on_change)
+
+    @property
+    def active(self):
+        return self.store.active_count
+
+    @property
+    def deleted(self):
+        return len(self.store.contacts) - self.store.active_count
+
+    @property
+    def missing_email(self):
+        self._build()
+        return self._missing_email
+
+    @property
+    def missing_address(self):
+        self._build()
+        return self._missing_address
+
+    def added_per_day(self, last=None):
+        """``[("2024-01-31", count), ...]`` oldest first, optionally just the ``last`` days"""
+        self._build()
+        days = sorted(self._days.items())
+        return [(unpack_day(day), count) for day, count in days[-last if last else 0:]]
+
+    def added_per_month(self, last=None):
+        """``[("2024-01", count), ...]`` oldest first, optionally just the ``last`` months"""
+        self._build()
+        months = sorted(self._months.items())
+        return [(unpack_month(month), count) for month, count in months[-last if last else 0:]]
+
+    def top_domains(self, count=10):
+        """The most common email domains as ``[(domain, contacts), ...]``"""
+        self._build()
+        return self._domains.most_common(count)
+
+    def summary(self, top=10):
+        """Everything above as one dict, e.g. for JSON output"""
+        return {
+            "active": self.active,
+            "deleted": self.deleted,
+            "missing_email": self.missing_email,
+            "missing_address": self.missing_address,
+            "added_per_month": dict(self.added_per_month()),
+            "top_domains": dict(self.top_domains(top)),
+        }
+
+    def _build(self):
+        if self._facts is not None:
+            return
+        self._reset()
+        for contact in self.store.active_contacts():
+            self._add(contact)
+
+    def _reset(self):
+        self._facts = {}
+        self._days = Counter()
+        self._months = Counter()
+        self._domains = Counter()
+        self._missing_email = 0
+        self._missing_address = 0
+
+    def _on_change(self, event, contact):
+        self.version += 1
+        if self._facts is None:
+            return
+        if event == "load":
+            # Rebuilt on the next lookup
+            self._facts = None
+        elif event == "clear":
+            # Every contact is deleted, so there is nothing left to count
+            self._reset()
+        else:
+            # Also covers merges, which move a contact to a new id with a
+            # "delete" of the old id followed by an "add"
+            self._remove(contact.id)
+            if event != "delete" and not contact.deleted:
+                self._add(contact)
+
+    def _add(self, contact):
+        facts = _facts(contact)
+        self._facts[contact.id] = facts
+        self._count(facts, 1)
+
+    def _remove(self, contact_id):
+        facts = self._facts.pop(contact_id, None)
+        if facts is not None:
+            self._count(facts, -1)
+
+    def _count(self, facts, step):
+        day, domain, flags = facts
+        if day is not None:
+            self._bump(self._days, day, step)
+            self._bump(self._months, day // 100, step)
+        if domain is not None:
+            self._bump(self._domains, domain, step)
+        if flags & 1:
+            self._missing_email += step
+        if flags & 2:
+            self._missing_address += step
+
+    @staticmethod
+    def _bump(counter, key, step):
+        count = counter[key] + step
+        if count:
+            counter[key] = count
+        else:
+            del counter[key]
@@ -0,0 +1,298 @@
+"""Finding contacts that are probably the same person
+
+Comparing every contact with every other one is quadratic, so contacts
+are first put into blocks by cheap keys and only pairs that share a block
+are scored:
+
+    phone   the last ten digits, so "+1 555 123 4567" meets "(555) 123-4567"
+    email   lowercased
+    name    Soundex codes of the first and last name words, so "Jon Smyth"
+            meets "John Smith" (and "Smith, John")
+
+A block that grows past MAX_BLOCK (a very common name, say) is not
+compared all-pairs; its contacts are sorted and each one is compared with
+the next WINDOW only. The work is therefore bounded by a constant per
+contact and stays close to linear on large address books.
+"""
+import re
+import threading
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+from records import snapshot
+from validation import NON_DIGITS
+
+# Pairs scoring at least this are reported
+DEFAULT_THRESHOLD = 0.8
+# Larger blocks are compared with a sliding window instead of all pairs
+MAX_BLOCK = 50
+WINDOW = 10
+# Contacts keyed per progress update / cancellation check
+CHUNK_SIZE = 5000
+
+NAME_WORDS = re.compile(r"[^\W\d_]+")
+SOUNDEX_CODES = {}
+for _letters, _code in (("bfpv", "1"), ("cgjkqsxz", "2"), ("dt", "3"), ("l", "4"),
+                        ("mn", "5"), ("r", "6"), ("hw", "")):
+    for _letter in _letters:
+        SOUNDEX_CODES[_letter] = _code
+
+
+class DuplicateSearchCancelled(Exception):
+    """Raised inside ``find_duplicates`` when the user cancels"""
+
+
+@lru_cache(maxsize=65536)
+def soundex(word):
+    """American Soundex code of a lowercase word ("robert" gives R163)"""
+    if not word:
+        return ""
+    code = word[0].upper()
+    last = SOUNDEX_CODES.get(word[0], "0")
+    for letter in word[1:]:
+        digit = SOUNDEX_CODES.get(letter, "0")
+        if digit and digit != last and digit != "0":
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in "hw":
+            last = digit
+    return code.ljust(4, "0")
+
+
+@lru_cache(maxsize=65536)
+def sorted_name(name):
+    """A lowercase name's words in order, punctuation dropped ("smith, john" gives "john smith")"""
+    return " ".join(sorted(NAME_WORDS.findall(name)))
+
+
+def name_key(name):
+    """Phonetic key of a lowercase name: Soundex of its first and last words
+
+    The two codes are sorted, so "john smith" and "smith, john" match.
+    """
+    words = NAME_WORDS.findall(name)
+    if not words:
+        return None
+    codes = sorted({soundex(words[0]), soundex(words[-1])})
+    return " ".join(codes)
+
+
+class DuplicatePair:
+    """Two contacts that look alike, with their score and the reasons"""
+
+    __slots__ = ("first_id", "second_id", "score", "reasons")
+
+    def __init__(self, first_id, second_id, score, reasons):
+        self.first_id = first_id
+        self.second_id = second_id
+        self.score = score
+        self.reasons = reasons
+
+    def __repr__(self):
+        return f"DuplicatePair({self.first_id}, {self.second_id}, {self.score:.2f}, {self.reasons!r})"
+
+
+def prepare(contacts):
+    """Normalized fields for matching: ``(id, name, phone, email, address)``
+
+    Takes Contact records (active ones only) or rows from
+    ``records.snapshot``. Names, emails and addresses are lowercased and
+    phones reduced to their last ten digits.
+    """
+    rows = []
+    for contact in contacts:
+        if isinstance(contact, tuple):
+            contact_id, name, phone, email, address = contact[:5]
+        else:
+            contact_id, name, phone = contact.id, contact.name, contact.phone
+            email, address = contact.email, contact.address
+        rows.append((contact_id, " ".join(name.lower().split()), NON_DIGITS.sub("", phone)[-10:],
+                     email.strip().lower(), " ".join(address.lower().split())))
+    return rows
+
+
+def one_digit_off(a, b):
+    """Whether two digit strings of equal length differ in exactly one place"""
+    if len(a) != len(b):
+        return False
+    # One of the halves has to match exactly; that rules most pairs out fast
+    half = len(a) // 2
+    if a[:half] != b[:half] and a[half:] != b[half:]:
+        return False
+    differences = 0
+    for x, y in zip(a, b):
+        if x != y:
+            differences += 1
+            if differences > 1:
+                return False
+    return differences == 1
+
+
+def score_pair(a, b, threshold=0.0):
+    """Score two prepared rows from 0 to 1; returns ``(score, reasons)``
+
+    A shared phone number or email is strong evidence, and the score then
+    depends on how alike the names are (family members sharing a landline
+    stay below the default threshold). Without one, a very similar name
+    only counts when something else backs it up: the same address, the
+    same mailbox name at another provider, or a phone number one digit
+    off. Names are compared last, since that is the slow part, and not at
+    all when the pair can't reach ``threshold``; word order and punctuation
+    are ignored, so "Smith, John" is the same name as "John Smith".
+    """
+    _, name_a, phone_a, email_a, address_a = a
+    _, name_b, phone_b, email_b, address_b = b
+    reasons = []
+    if phone_a == phone_b:
+        reasons.append("same phone")
+    if email_a and email_a == email_b:
+        reasons.append("same email")
+    if reasons:
+        base, weight = 0.4, 0.6
+    else:
+        if address_a and address_a == address_b:
+            reasons.append("same address")
+        if email_a and email_b and email_a.partition("@")[0] == email_b.partition("@")[0]:
+            reasons.append("same mailbox name")
+        if one_digit_off(phone_a, phone_b):
+            reasons.append("phone one digit off")
+        if not reasons:
+            return 0.0, reasons
+        base, weight = 0.0, 0.9
+
+    if name_a != name_b:
+        name_a, name_b = sorted_name(name_a), sorted_name(name_b)
+    if name_a == name_b:
+        name = 1.0
+    else:
+        matcher = SequenceMatcher(None, name_a, name_b, autojunk=False)
+        if base + weight * matcher.quick_ratio() < threshold:
+            return 0.0, reasons
+        name = matcher.ratio()
+    if name == 1.0:
+        reasons.insert(0, "same name")
+    elif name >= 0.8:
+        reasons.insert(0, "similar name")
+    return base + weight * name, reasons
+
+
+def candidate_blocks(rows, progress=None, cancelled=None):
+    """Lists of indexes into ``rows`` that share a blocking key"""
+    blocks = {}
+    for start in range(0, len(rows), CHUNK_SIZE):
+        if cancelled and cancelled():
+            raise DuplicateSearchCancelled()
+        for i in range(start, min(start + CHUNK_SIZE, len(rows))):
+            _, name, phone, email, _ = rows[i]
+            keys = [("phone", phone)]
+            if email:
+                keys.append(("email", email))
+            key = name_key(name)
+            if key:
+                keys.append(("name", key))
+            for key in keys:
+                members = blocks.get(key)
+                if members is None:
+                    blocks[key] = [i]
+                else:
+                    members.append(i)
+        if progress:
+            progress(min(start + CHUNK_SIZE, len(rows)))
+    return [members for members in blocks.values() if len(members) > 1]
+
+
+def find_duplicates(contacts, threshold=DEFAULT_THRESHOLD, progress=None, cancelled=None):
+    """Likely duplicates among ``contacts``, best matches first
+
+    ``contacts`` are active Contact records or snapshot rows (see
+    ``prepare``). ``progress(n)`` is called as the work advances, with
+    ``n`` going up to twice the number of contacts (blocking, then
+    scoring). ``cancelled()`` is checked now and then; it raises
+    DuplicateSearchCancelled when it returns True.
+
+    Two contacts can share more than one block. Rather than remembering
+    every pair compared, such pairs are simply scored again (that is
+    cheap for all but real matches) and only the results are deduplicated.
+    """
+    rows = prepare(contacts)
+    blocks = candidate_blocks(rows, progress, cancelled)
+    found = {}
+    for count, members in enumerate(blocks):
+        if count % CHUNK_SIZE == 0:
+            if cancelled and cancelled():
+                raise DuplicateSearchCancelled()
+            if progress:
+                progress(len(rows) + len(rows) * count // len(blocks))
+        size = len(members)
+        if size > MAX_BLOCK:
+            # Sorted neighbourhood: only compare near neighbours by name
+            members.sort(key=lambda i: rows[i][1])
+            span = WINDOW
+        else:
+            span = size
+        for x in range(size):
+            i = members[x]
+            row = rows[i]
+            for y in range(x + 1, min(x + 1 + span, size)):
+                j = members[y]
+                pair = (i, j) if i < j else (j, i)
+                if pair in found:
+                    continue
+                score, reasons = score_pair(row, rows[j], threshold)
+                if score >= threshold:
+                    found[pair] = DuplicatePair(rows[pair[0]][0], rows[pair[1]][0], score, reasons)
+    return sorted(found.values(), key=lambda pair: (-pair.score, pair.first_id, pair.second_id))
+
+
+def merge_duplicate(store, keep, other):
+    """Fold ``other`` into ``keep`` and delete it; the caller saves
+
+    ``keep`` keeps its own name and phone; an email or address it lacks
+    is taken from ``other``. Both steps are one entry in the undo log.
+    """
+    with store.group(f"merging {other.name} into {keep.name}"):
+        store.update(keep, keep.name, keep.phone, keep.email or other.email,
+                     keep.address or other.address)
+        store.delete(other)
+    return keep
+
+
+class DuplicateJob:
+    """Runs ``find_duplicates`` on a background thread
+
+    The active contacts are copied when the job is created (on the Tk
+    thread), so the store may change while the search runs; pairs whose
+    contacts were edited or deleted meanwhile should be checked again
+    before merging. ``processed`` runs up to ``total`` (see
+    ``find_duplicates``).
+    """
+
+    def __init__(self, store, threshold=DEFAULT_THRESHOLD):
+        self.rows = snapshot(store.active_contacts())
+        self.total = 2 * len(self.rows)
+        self.threshold = threshold
+        self.processed = 0
+        self.done = False
+        self.error = None
+        self.pairs = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _run(self):
+        try:
+            self.pairs = find_duplicates(self.rows, self.threshold, progress=self._progress,
+                                         cancelled=self._cancel.is_set)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def _progress(self, count):
+        self.processed = count
@@ -0,0 +1,223 @@
+import csv
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import metrics
+from records import to_json
+
+# Records are formatted in batches and handed to the file in one write
+BATCH_SIZE = 1000
+WRITE_BUFFER = 1 << 20
+
+CSV_FIELDS = ["id", "name", "phone", "email", "address", "date_added", "date_modified"]
+
+
+class ExportCancelled(Exception):
+    """Raised inside an export when the user cancels it"""
+
+
+def write_text(f, contacts):
+    """The original human-readable export layout"""
+    f.write("CONTACT LIST EXPORT\n")
+    f.write("=" * 50 + "\n\n")
+    count = 0
+    for batch in batched(contacts):
+        lines = []
+        for contact in batch:
+            count += 1
+            lines.append(f"{count}. {contact['name']}\n")
+            lines.append(f"   Phone: {contact['phone']}\n")
+            if contact['email']:
+                lines.append(f"   Email: {contact['email']}\n")
+            if contact['address']:
+                lines.append(f"   Address: {contact['address']}\n")
+            lines.append(f"   Added: {contact['date_added']}\n")
+            lines.append("\n")
+        f.write("".join(lines))
+    f.write(f"\nTotal contacts exported: {count}\n")
+    f.write(f"Export date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+
+def write_csv(f, contacts):
+    """One row per contact with a header line"""
+    writer = csv.writer(f)
+    writer.writerow(CSV_FIELDS)
+    for batch in batched(contacts):
+        writer.writerows([contact.get(field) or "" for field in CSV_FIELDS] for contact in batch)
+
+
+def write_jsonl(f, contacts):
+    """One JSON object per line, the same shape as in contacts.json"""
+    for batch in batched(contacts):
+        f.write("".join(json.dumps(contact, ensure_ascii=False, default=to_json) + "\n" for contact in batch))
+
+
+def write_vcard(f, contacts):
+    """vCard 4.0 (RFC 6350), one card per contact"""
+    for batch in batched(contacts):
+        f.write("".join(vcard(contact) for contact in batch))
+
+
+def vcard(contact):
+    """Format a single contact as a vCard 4.0 card"""
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:4.0",
+        f"UID:contact-{contact['id']}",
+        "FN:" + vcard_escape(contact['name']),
+        "TEL;VALUE=text:" + vcard_escape(contact['phone']),
+    ]
+    if contact.get('email'):
+        lines.append("EMAIL:" + vcard_escape(contact['email']))
+    if contact.get('address'):
+        # The whole address goes into the street component of ADR
+        lines.append("ADR:;;" + vcard_escape(contact['address']) + ";;;;")
+    modified = contact.get('date_modified') or contact.get('date_added')
+    if modified:
+        try:
+            rev = datetime.strptime(modified, "%Y-%m-%d %H:%M").strftime("%Y%m%dT%H%M00")
+            lines.append("REV:" + rev)
+        except ValueError:
+            pass
+    lines.append("END:VCARD")
+    return "".join(vcard_fold(line) + "\r\n" for line in lines)
+
+
+def vcard_escape(value):
+    """Escape text for a vCard property value"""
+    return (str(value).replace("\\", "\\\\").replace(",", "\\,")
+            .replace(";", "\\;").replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def vcard_fold(line, limit=75):
+    """Fold a content line at 75 octets as RFC 6350 requires"""
+    if len(line.encode('utf-8')) <= limit:
+        return line
+    parts = []
+    current = ""
+    size = 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        # Continuation lines start with a space, which counts toward the limit
+        if size + char_size > (limit if not parts else limit - 1):
+            parts.append(current)
+            current, size = "", 0
+        current += char
+        size += char_size
+    parts.append(current)
+    return "\r\n ".join(parts)
+
+
+# name -> (file extension, writer, open() newline argument)
+EXPORT_FORMATS = {
+    "text": (".txt", write_text, None),
+    "csv": (".csv", write_csv, ""),
+    "jsonl": (".jsonl", write_jsonl, None),
+    "vcard": (".vcf", write_vcard, ""),
+}
+
+
+def register_format(name, extension, writer, newline=None):
+    """Add an export format; ``writer(f, contacts)`` streams into ``f``"""
+    EXPORT_FORMATS[name] = (extension, writer, newline)
+
+
+def format_for_path(path):
+    """Guess the export format from a file name, defaulting to text"""
+    suffix = Path(path).suffix.lower()
+    for name, (extension, _, _) in EXPORT_FORMATS.items():
+        if extension == suffix:
+            return name
+    return "text"
+
+
+def batched(contacts, size=BATCH_SIZE):
+    """Group an iterable of contacts into lists of ``size``"""
+    batch = []
+    for contact in contacts:
+        batch.append(contact)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@metrics.span("export")
+def export_contacts(contacts, path, fmt="text", progress=None, cancelled=None):
+    """Stream ``contacts`` into ``path`` and return how many were written
+
+    ``contacts`` can be any iterable, so callers can pass a generator and
+    avoid building a copy of the address book. ``progress(count)`` is
+    called after every batch. If ``cancelled()`` becomes true the partial
+    file is removed and ExportCancelled is raised.
+    """
+    _, writer, newline = EXPORT_FORMATS[fmt]
+    count = 0
+
+    def tracked():
+        nonlocal count
+        for contact in contacts:
+            yield contact
+            count += 1
+            if count % BATCH_SIZE == 0:
+                if cancelled and cancelled():
+                    raise ExportCancelled()
+                if progress:
+                    progress(count)
+
+    path = Path(path)
+    try:
+        with open(path, 'w', encoding='utf-8', newline=newline, buffering=WRITE_BUFFER) as f:
+            writer(f, tracked())
+    except ExportCancelled:
+        os.remove(path)
+        raise
+    if progress:
+        progress(count)
+    if metrics.ENABLED:
+        metrics.add_bytes("export", written=path.stat().st_size)
+    return count
+
+
+class ExportJob:
+    """Runs ``export_contacts`` on a background thread
+
+    The Tk side polls ``processed``, ``done`` and ``error`` with after();
+    nothing here touches Tk.
+    """
+
+    def __init__(self, contacts, path, fmt="text"):
+        self.contacts = contacts
+        self.path = Path(path)
+        self.fmt = fmt
+        self.processed = 0
+        self.done = False
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _run(self):
+        try:
+            self.processed = export_contacts(self.contacts, self.path, self.fmt,
+                                             progress=self._progress, cancelled=self._cancel.is_set)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def _progress(self, count):
+        self.processed = count
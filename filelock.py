@@ -0,0 +1,71 @@
+import os
+from pathlib import Path
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+    """Advisory lock shared by every instance that uses the same data file
+
+    The lock lives in a separate ``<data file>.lock`` file because the data
+    file itself is replaced on every save. Only cooperating processes are
+    kept out; nothing stops other programs from touching the data file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(str(path) + ".lock")
+        self._file = None
+
+    @property
+    def locked(self):
+        return self._file is not None
+
+    def acquire(self, blocking=True):
+        """Take the lock; without ``blocking``, return False if it is held"""
+        if self._file is not None:
+            raise RuntimeError(f"{self.path} is already locked")
+        f = open(self.path, 'a+b')
+        try:
+            if os.name == 'nt':
+                # msvcrt.LK_LOCK only retries for ten seconds, so loop
+                mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+                while True:
+                    try:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), mode, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            f.close()
+            if blocking:
+                raise
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        f, self._file = self._file, None
+        if f is None:
+            return
+        try:
+            if os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,1144 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import json
+import os
+import threading
+from datetime import datetime
+
+import metrics
+from contact_stats import ContactStats
+from duplicates import DuplicateJob, DuplicateSearchCancelled, merge_duplicate
+from exporters import ExportCancelled, ExportJob, format_for_path
+from importers import ImportCancelled, ImportJob, commit_import
+from search_index import SearchIndex, contact_matches
+from saver import BackgroundSaver
+from search_worker import BackgroundSearch
+from sort_index import SortedIndex
+from storage import default_data_file, open_storage
+from store import ContactStore
+from validation import validate_email, validate_phone
+from virtual_list import VirtualTreeview
+
+
+class ContactManager:
+    # Contact list column -> heading text
+    HEADINGS = {
+        "Name": "Name",
+        "Phone": "Phone Number",
+        "Email": "Email Address",
+        "Address": "Address",
+        "Added": "Date Added",
+    }
+    # Contact list column -> SortedIndex column for the sortable ones
+    SORT_COLUMNS = {"Name": "name", "Phone": "phone", "Email": "email", "Added": "added"}
+
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Contact Manager")
+        self.root.geometry("900x700")
+        self.root.minsize(800, 600)
+
+        # Data storage: store contacts.json in the same folder as this script
+        self.data_file = default_data_file()
+        # create file if not exists (avoid read errors)
+        if not self.data_file.exists():
+            try:
+                self.data_file.write_text("[]", encoding="utf-8")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to create data file: {e}")
+
+        self.storage = open_storage(self.data_file)
+        # A binary snapshot can show its first screen straight away; the
+        # contacts are then loaded on a worker thread (see start_loading)
+        self.preview = self.open_preview()
+        self.store = ContactStore(None if self.preview is not None else self.load_contacts(),
+                                  next_id=self.storage.next_id)
+        # Set up once the contacts are loaded (see finish_startup)
+        self.saver = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # SQLite answers searches itself; other engines use an in-memory index
+        self.search_index = None if self.storage.supports_search else SearchIndex(self.store)
+        # Sorted orders for the list columns, kept up to date as contacts change
+        self.sort_index = SortedIndex(self.store)
+        # Totals and breakdowns for the statistics window, also kept up to date
+        self.stats = ContactStats(self.store)
+        self.sort_column = "name"
+        self.sort_reverse = False
+        # Typing in the search box filters on a worker thread
+        self.searcher = BackgroundSearch(self.root, self.filter_contacts, self.show_search_results)
+
+        self.setup_ui()
+        if self.preview is not None:
+            self.start_loading()
+        else:
+            self.finish_startup()
+
+    def finish_startup(self):
+        """Start saving and show the loaded contacts"""
+        # Changes are written in the background, a burst of edits at a time,
+        # and saves from other instances are merged in as they happen
+        self.saver = BackgroundSaver(self.root, self.storage, self.store, self.show_save_error,
+                                     on_merge=self.show_external_changes)
+        if self.storage.needs_compaction() or self.store.needs_compaction():
+            self.compact_storage()
+        self.refresh_contact_list()
+
+    def open_preview(self):
+        """First screen of contacts to show before loading, or None"""
+        if not self.storage.supports_preview:
+            return None
+        try:
+            return self.storage.preview()
+        except (OSError, ValueError):
+            # Load the usual way, which reports the problem
+            return None
+
+    def start_loading(self):
+        """Show the preview and load every contact on a worker thread
+
+        The list scrolls through the preview meanwhile, decoding rows as
+        they come into view. Everything else waits for the load (see
+        ``still_loading``).
+        """
+        self.contact_list.set_rows(self.preview)
+        self.stats_label.config(text=f"Loading {len(self.preview)} contacts...")
+        self.status_var.set("Loading contacts...")
+        result = {}
+
+        def work():
+            try:
+                result['contacts'] = self.read_contacts()
+            except Exception as e:
+                result['error'] = e
+
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+
+        def poll():
+            if worker.is_alive():
+                self.root.after(50, poll)
+                return
+            if 'error' in result:
+                contacts = self.load_failed(result['error'])
+            else:
+                contacts = result['contacts']
+            self.store.load(contacts, self.storage.next_id)
+            preview, self.preview = self.preview, None
+            # Show the loaded rows before the snapshot is closed (and maybe compacted)
+            self.refresh_contact_list()
+            preview.close()
+            self.status_var.set("Ready")
+            self.finish_startup()
+
+        self.root.after(50, poll)
+
+    def still_loading(self):
+        """True (and says so in the status bar) until the contacts are loaded"""
+        if self.preview is None:
+            return False
+        self.status_var.set("Still loading contacts, one moment...")
+        return True
+
+    def setup_ui(self):
+        # Main frame with padding
+        main_frame = ttk.Frame(self.root, padding="15")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+        # Configure grid weights
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        main_frame.rowconfigure(2, weight=1)
+
+        # Title
+        title_label = ttk.Label(main_frame, text="📞 Contact Manager",
+                                font=('Arial', 20, 'bold'))
+        title_label.grid(row=0, column=0, columnspan=3, pady=(0, 20))
+
+        # Add contact section
+        self.create_add_contact_frame(main_frame)
+
+        # Search and filter section
+        self.create_search_frame(main_frame)
+
+        # Contact list section
+        self.create_contact_list_frame(main_frame)
+
+        # Action buttons
+        self.create_action_buttons(main_frame)
+
+        # Status bar
+        self.status_var = tk.StringVar()
+        self.status_var.set("Ready")
+        status_bar = ttk.Label(main_frame, textvariable=self.status_var,
+                               relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
+
+    def create_add_contact_frame(self, parent):
+        # Add contact frame
+        add_frame = ttk.LabelFrame(parent, text="Add New Contact", padding="15")
+        add_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 15))
+        add_frame.columnconfigure(1, weight=1)
+        add_frame.columnconfigure(3, weight=1)
+
+        # First row: Name and Phone
+        ttk.Label(add_frame, text="Name*:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
+        self.name_entry = ttk.Entry(add_frame, width=25)
+        self.name_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(0, 15))
+
+        ttk.Label(add_frame, text="Phone*:").grid(row=0, column=2, sticky=tk.W, padx=(0, 5))
+        self.phone_entry = ttk.Entry(add_frame, width=20)
+        self.phone_entry.grid(row=0, column=3, sticky=(tk.W, tk.E))
+
+        # Second row: Email and Address
+        ttk.Label(add_frame, text="Email:").grid(row=1, column=0, sticky=tk.W, padx=(0, 5), pady=(10, 0))
+        self.email_entry = ttk.Entry(add_frame, width=25)
+        self.email_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=(0, 15), pady=(10, 0))
+
+        ttk.Label(add_frame, text="Address:").grid(row=1, column=2, sticky=tk.W, padx=(0, 5), pady=(10, 0))
+        self.address_entry = ttk.Entry(add_frame, width=30)
+        self.address_entry.grid(row=1, column=3, sticky=(tk.W, tk.E), pady=(10, 0))
+
+        # Add button
+        add_btn = ttk.Button(add_frame, text="Add Contact", command=self.add_contact)
+        add_btn.grid(row=2, column=0, columnspan=4, pady=(15, 0))
+
+        # Bind Enter key to add contact
+        self.name_entry.bind('<Return>', lambda e: self.add_contact())
+        self.phone_entry.bind('<Return>', lambda e: self.add_contact())
+        self.email_entry.bind('<Return>', lambda e: self.add_contact())
+        self.address_entry.bind('<Return>', lambda e: self.add_contact())
+
+    def create_search_frame(self, parent):
+        # Search frame
+        search_frame = ttk.Frame(parent)
+        search_frame.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N), padx=(0, 15))
+
+        ttk.Label(search_frame, text="Search Contacts", font=('Arial', 12, 'bold')).pack(anchor=tk.W)
+
+        # Search entry
+        search_entry_frame = ttk.Frame(search_frame)
+        search_entry_frame.pack(fill=tk.X, pady=(5, 10))
+
+        ttk.Label(search_entry_frame, text="🔍").pack(side=tk.LEFT, padx=(0, 5))
+        self.search_entry = ttk.Entry(search_entry_frame)
+        self.search_entry.pack(fill=tk.X, side=tk.LEFT, expand=True)
+        self.search_entry.bind('<KeyRelease>', lambda e: self.search_contacts())
+
+        # Search options
+        self.search_option = tk.StringVar(value="name")
+        ttk.Radiobutton(search_frame, text="Search by Name",
+                        variable=self.search_option, value="name",
+                        command=self.search_contacts).pack(anchor=tk.W)
+        ttk.Radiobutton(search_frame, text="Search by Phone",
+                        variable=self.search_option, value="phone",
+                        command=self.search_contacts).pack(anchor=tk.W)
+        ttk.Radiobutton(search_frame, text="Search All Fields",
+                        variable=self.search_option, value="all",
+                        command=self.search_contacts).pack(anchor=tk.W)
+
+        # Statistics
+        self.stats_label = ttk.Label(search_frame, text="", font=('Arial', 9))
+        self.stats_label.pack(anchor=tk.W, pady=(15, 0))
+
+        # Clear search button
+        ttk.Button(search_frame, text="Clear Search",
+                   command=self.clear_search).pack(anchor=tk.W, pady=(10, 0))
+
+    def create_contact_list_frame(self, parent):
+        # Contact list frame
+        list_frame = ttk.LabelFrame(parent, text="Contact List", padding="10")
+        list_frame.grid(row=2, column=1, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+        list_frame.columnconfigure(0, weight=1)
+        list_frame.rowconfigure(0, weight=1)
+
+        # Treeview for contacts; only the visible rows are materialized
+        columns = ("Name", "Phone", "Email", "Address", "Added")
+        self.contact_list = VirtualTreeview(list_frame, columns, self.contact_row_values,
+                                            row_key=lambda contact: contact.id, height=18)
+        self.tree = self.contact_list.tree
+
+        # Define column headings and widths; clicking a heading sorts by it
+        for column, text in self.HEADINGS.items():
+            sort_column = self.SORT_COLUMNS.get(column)
+            if sort_column:
+                self.tree.heading(column, text=text,
+                                  command=lambda c=sort_column: self.sort_contacts(c))
+            else:
+                self.tree.heading(column, text=text)
+        self.update_sort_headings()
+
+        self.tree.column("Name", width=150)
+        self.tree.column("Phone", width=120)
+        self.tree.column("Email", width=180)
+        self.tree.column("Address", width=200)
+        self.tree.column("Added", width=100)
+
+        # Scrollbars (the vertical one scrolls through the whole result list)
+        v_scrollbar = self.contact_list.v_scrollbar
+        h_scrollbar = ttk.Scrollbar(list_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+
+        # Grid scrollbars and treeview
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+
+        # Bind double-click to view contact details
+        self.tree.bind('<Double-1>', self.view_contact_details)
+
+    def create_action_buttons(self, parent):
+        # Action buttons frame
+        btn_frame = ttk.Frame(parent)
+        btn_frame.grid(row=3, column=0, columnspan=3, pady=(15, 0))
+
+        ttk.Button(btn_frame, text="View Details",
+                   command=self.view_contact_details).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Edit Contact",
+                   command=self.edit_contact).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Delete Contact",
+                   command=self.delete_contact).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Import Contacts",
+                   command=self.import_contacts).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Export Contacts",
+                   command=self.export_contacts).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Statistics",
+                   command=self.show_statistics).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Find Duplicates",
+                   command=self.find_duplicates).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Clear All",
+                   command=self.clear_all_contacts).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Undo", command=self.undo).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Redo", command=self.redo).pack(side=tk.LEFT)
+        self.root.bind('<Control-z>', lambda e: self.undo_key(e, self.undo))
+        self.root.bind('<Control-y>', lambda e: self.undo_key(e, self.redo))
+        self.root.bind('<Control-Z>', lambda e: self.undo_key(e, self.redo))
+
+        if metrics.ENABLED:
+            ttk.Button(btn_frame, text="Diagnostics",
+                       command=self.show_diagnostics).pack(side=tk.LEFT, padx=(10, 0))
+            self.root.bind('<F12>', lambda e: self.show_diagnostics())
+
+    def validate_email(self, email):
+        """Validate email format"""
+        return validate_email(email)
+
+    def validate_phone(self, phone):
+        """Validate phone number format"""
+        return validate_phone(phone)
+
+    @metrics.span("add_contact")
+    def add_contact(self):
+        if self.still_loading():
+            return
+        name = self.name_entry.get().strip()
+        phone = self.phone_entry.get().strip()
+        email = self.email_entry.get().strip()
+        address = self.address_entry.get().strip()
+
+        # Validation
+        if not name:
+            messagebox.showwarning("Warning", "Name is required.")
+            self.name_entry.focus()
+            return
+
+        if not phone:
+            messagebox.showwarning("Warning", "Phone number is required.")
+            self.phone_entry.focus()
+            return
+
+        if not self.validate_phone(phone):
+            messagebox.showerror("Error", "Please enter a valid phone number (at least 10 digits).")
+            self.phone_entry.focus()
+            return
+
+        if email and not self.validate_email(email):
+            messagebox.showerror("Error", "Please enter a valid email address.")
+            self.email_entry.focus()
+            return
+
+        # Check for duplicate phone numbers
+        if self.store.phone_exists(phone):
+            messagebox.showwarning("Warning", "A contact with this phone number already exists.")
+            return
+
+        # Create new contact
+        self.store.add(name, phone, email, address)
+        self.save_contacts()
+        self.refresh_contact_list()
+        self.clear_form()
+
+        self.status_var.set(f"Contact added: {name}")
+
+    def clear_form(self):
+        """Clear all input fields"""
+        self.name_entry.delete(0, tk.END)
+        self.phone_entry.delete(0, tk.END)
+        self.email_entry.delete(0, tk.END)
+        self.address_entry.delete(0, tk.END)
+        self.name_entry.focus()
+
+    def get_selected_contact(self):
+        """Get the currently selected contact"""
+        if self.still_loading():
+            return None
+        key = self.contact_list.selected_key()
+        if key is None:
+            messagebox.showwarning("Warning", "Please select a contact.")
+            return None
+
+        # Tree items are keyed by contact id
+        contact = self.store.get(int(key))
+        if contact is None or contact.deleted:
+            return None
+        return contact
+
+    def contact_row_values(self, contact):
+        """Column values shown for a contact in the list"""
+        date_added = (contact.date_added or "")[:10]  # Just the date part
+        return (
+            contact.name,
+            contact.phone,
+            contact.email,
+            contact.address,
+            date_added
+        )
+
+    def view_contact_details(self, event=None):
+        """Show detailed view of selected contact"""
+        contact = self.get_selected_contact()
+        if not contact:
+            return
+
+        # Create details window
+        details_window = tk.Toplevel(self.root)
+        details_window.title(f"Contact Details - {contact['name']}")
+        details_window.geometry("450x350")
+        details_window.transient(self.root)
+        details_window.grab_set()
+
+        # Center the window
+        details_window.geometry("+%d+%d" % (
+            self.root.winfo_rootx() + 50,
+            self.root.winfo_rooty() + 50
+        ))
+
+        # Main frame
+        main_frame = ttk.Frame(details_window, padding="20")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Title
+        ttk.Label(main_frame, text="Contact Information",
+                  font=('Arial', 14, 'bold')).pack(pady=(0, 20))
+
+        # Contact details
+        details_frame = ttk.Frame(main_frame)
+        details_frame.pack(fill=tk.BOTH, expand=True)
+
+        fields = [
+            ("Name:", contact['name']),
+            ("Phone:", contact['phone']),
+            ("Email:", contact['email'] or "Not provided"),
+            ("Address:", contact['address'] or "Not provided"),
+            ("Date Added:", contact['date_added']),
+            ("Last Modified:", contact.get('date_modified', contact['date_added']))
+        ]
+
+        for i, (label, value) in enumerate(fields):
+            ttk.Label(details_frame, text=label, font=('Arial', 10, 'bold')).grid(
+                row=i, column=0, sticky=tk.W, pady=5, padx=(0, 10)
+            )
+            ttk.Label(details_frame, text=str(value), wraplength=250).grid(
+                row=i, column=1, sticky=tk.W, pady=5
+            )
+
+        # Close button
+        ttk.Button(main_frame, text="Close",
+                   command=details_window.destroy).pack(pady=(20, 0))
+
+    def edit_contact(self):
+        """Edit selected contact"""
+        contact = self.get_selected_contact()
+        if not contact:
+            return
+
+        # Create edit window
+        edit_window = tk.Toplevel(self.root)
+        edit_window.title(f"Edit Contact - {contact['name']}")
+        edit_window.geometry("500x300")
+        edit_window.transient(self.root)
+        edit_window.grab_set()
+
+        # Center the window
+        edit_window.geometry("+%d+%d" % (
+            self.root.winfo_rootx() + 50,
+            self.root.winfo_rooty() + 50
+        ))
+
+        # Main frame
+        main_frame = ttk.Frame(edit_window, padding="20")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        main_frame.columnconfigure(1, weight=1)
+
+        # Title
+        ttk.Label(main_frame, text="Edit Contact",
+                  font=('Arial', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=(0, 20))
+
+        # Form fields
+        ttk.Label(main_frame, text="Name*:").grid(row=1, column=0, sticky=tk.W, pady=5, padx=(0, 10))
+        name_entry = ttk.Entry(main_frame, width=40)
+        name_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=5)
+        name_entry.insert(0, contact['name'])
+
+        ttk.Label(main_frame, text="Phone*:").grid(row=2, column=0, sticky=tk.W, pady=5, padx=(0, 10))
+        phone_entry = ttk.Entry(main_frame, width=40)
+        phone_entry.grid(row=2, column=1, sticky=(tk.W, tk.E), pady=5)
+        phone_entry.insert(0, contact['phone'])
+
+        ttk.Label(main_frame, text="Email:").grid(row=3, column=0, sticky=tk.W, pady=5, padx=(0, 10))
+        email_entry = ttk.Entry(main_frame, width=40)
+        email_entry.grid(row=3, column=1, sticky=(tk.W, tk.E), pady=5)
+        email_entry.insert(0, contact['email'])
+
+        ttk.Label(main_frame, text="Address:").grid(row=4, column=0, sticky=tk.W, pady=5, padx=(0, 10))
+        address_entry = ttk.Entry(main_frame, width=40)
+        address_entry.grid(row=4, column=1, sticky=(tk.W, tk.E), pady=5)
+        address_entry.insert(0, contact['address'])
+
+        def save_changes():
+            new_name = name_entry.get().strip()
+            new_phone = phone_entry.get().strip()
+            new_email = email_entry.get().strip()
+            new_address = address_entry.get().strip()
+
+            # Validation
+            if not new_name:
+                messagebox.showwarning("Warning", "Name is required.")
+                return
+
+            if not new_phone:
+                messagebox.showwarning("Warning", "Phone number is required.")
+                return
+
+            if not self.validate_phone(new_phone):
+                messagebox.showerror("Error", "Please enter a valid phone number.")
+                return
+
+            if new_email and not self.validate_email(new_email):
+                messagebox.showerror("Error", "Please enter a valid email address.")
+                return
+
+            # Check for duplicate phone (excluding current contact)
+            if self.store.phone_exists(new_phone, exclude_id=contact['id']):
+                messagebox.showwarning("Warning", "A contact with this phone number already exists.")
+                return
+
+            # Update contact
+            self.store.update(contact, new_name, new_phone, new_email, new_address)
+
+            self.save_contacts()
+            self.refresh_contact_list()
+            self.status_var.set(f"Contact updated: {new_name}")
+            edit_window.destroy()
+
+        # Buttons
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.grid(row=5, column=0, columnspan=2, pady=(20, 0))
+
+        ttk.Button(btn_frame, text="Save Changes", command=save_changes).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Cancel", command=edit_window.destroy).pack(side=tk.LEFT)
+
+    def delete_contact(self):
+        """Delete selected contact"""
+        contact = self.get_selected_contact()
+        if not contact:
+            return
+
+        if messagebox.askyesno("Confirm Delete",
+                               f"Are you sure you want to delete the contact '{contact['name']}'?\n\nUse Undo (Ctrl+Z) to bring it back."):
+            self.store.delete(contact)
+            self.save_contacts()
+            self.refresh_contact_list()
+            self.status_var.set(f"Contact deleted: {contact['name']}")
+
+    @metrics.span("search_contacts")
+    def search_contacts(self):
+        """Search contacts in the background once typing pauses"""
+        if self.still_loading():
+            # The search box is applied once loading finishes
+            return
+        self.searcher.request(self.search_entry.get().lower(), self.search_option.get(),
+                              self.sort_column, self.sort_reverse)
+
+    def show_search_results(self, filtered_contacts, search_args, timing):
+        """Display the results of a background search"""
+        self.show_contacts(filtered_contacts, search_args[0], search_args[1])
+        self.status_var.set(f"Found {len(filtered_contacts)} contacts in {timing['query_ms']:.1f} ms "
+                            f"({timing['total_ms']:.0f} ms after typing)")
+
+    def clear_search(self):
+        """Clear search field and show all contacts"""
+        self.search_entry.delete(0, tk.END)
+        self.refresh_contact_list()
+
+    @metrics.span("refresh_contact_list")
+    def refresh_contact_list(self):
+        """Refresh the contact list display"""
+        if self.still_loading():
+            return
+        # A pending background search would now show stale results
+        self.searcher.cancel()
+
+        # Get search criteria
+        search_term = self.search_entry.get().lower()
+        search_option = self.search_option.get()
+
+        # Filter contacts, in the order of the current sort column
+        filtered_contacts = self.filter_contacts(search_term, search_option,
+                                                 self.sort_column, self.sort_reverse)
+        self.show_contacts(filtered_contacts, search_term, search_option)
+
+    def sort_contacts(self, column):
+        """Sort the list by a column; clicking it again reverses the order"""
+        if self.still_loading():
+            return
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        self.update_sort_headings()
+        self.refresh_contact_list()
+
+    def update_sort_headings(self):
+        """Mark the sort column's heading with the sort direction"""
+        for column, text in self.HEADINGS.items():
+            if self.SORT_COLUMNS.get(column) == self.sort_column:
+                text += " ▼" if self.sort_reverse else " ▲"
+            self.tree.heading(column, text=text)
+
+    def show_contacts(self, filtered_contacts, search_term, search_option="name"):
+        """Show filtered contacts in the list and update the statistics"""
+        # Populate tree (only the visible window is turned into rows). The
+        # selected contact is looked up by id rather than in the list.
+        def listed(key):
+            contact = self.store.get(int(key))
+            return contact is not None and not contact.deleted and \
+                contact_matches(contact, search_term, search_option)
+
+        self.contact_list.set_rows(filtered_contacts, contains=listed)
+
+        # Update statistics
+        total_contacts = self.store.active_count
+        showing_contacts = len(filtered_contacts)
+
+        if search_term:
+            self.stats_label.config(text=f"Showing {showing_contacts} of {total_contacts} contacts")
+        else:
+            self.stats_label.config(text=f"Total contacts: {total_contacts}")
+
+    @metrics.span("filter_contacts")
+    def filter_contacts(self, search_term, search_option, sort_column="name", sort_reverse=False,
+                        is_stale=None):
+        """Return active contacts matching the search, sorted by ``sort_column``
+
+        Runs on the search worker thread too; there it returns None as soon
+        as ``is_stale()`` reports a newer search.
+        """
+        if not search_term:
+            ids = None
+        elif self.storage.supports_search:
+            # Let the database do the filtering
+            ids = self.storage.search(search_term, search_option)
+        else:
+            ids = self.search_index.search(search_term, search_option)
+        if is_stale and is_stale():
+            return None
+        # The sort index hands the matches back already in order
+        ids = self.sort_index.ordered(ids, sort_column, sort_reverse)
+        return self.store.get_many(ids)
+
+    @metrics.span("export_contacts")
+    def export_contacts(self):
+        """Export contacts to a text, CSV, JSON Lines or vCard file"""
+        if self.still_loading():
+            return
+        if not self.store.active_count:
+            messagebox.showinfo("Info", "No contacts to export.")
+            return
+
+        filename = filedialog.asksaveasfilename(
+            parent=self.root,
+            title="Export Contacts",
+            initialdir=self.data_file.parent,
+            initialfile=f"contacts_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            defaultextension=".txt",
+            filetypes=[("Text", "*.txt"), ("CSV", "*.csv"),
+                       ("JSON Lines", "*.jsonl"), ("vCard", "*.vcf")]
+        )
+        if not filename:
+            return
+
+        # The sorted list only holds references; records are formatted as they stream out
+        active_contacts = self.filter_contacts("", "name")
+        job = ExportJob(iter(active_contacts), filename, format_for_path(filename))
+
+        def finished():
+            if isinstance(job.error, ExportCancelled):
+                self.status_var.set("Export cancelled")
+            elif job.error:
+                messagebox.showerror("Error", f"Failed to export contacts: {job.error}")
+            else:
+                messagebox.showinfo("Success", f"{job.processed} contacts exported to {filename}")
+                self.status_var.set(f"Contacts exported to {filename}")
+
+        self.run_with_progress(job, len(active_contacts), "Exporting Contacts", finished)
+
+    def import_contacts(self):
+        """Import contacts from a CSV, JSON Lines or vCard file"""
+        if self.still_loading():
+            return
+        filename = filedialog.askopenfilename(
+            parent=self.root,
+            title="Import Contacts",
+            initialdir=self.data_file.parent,
+            filetypes=[("Contact files", "*.csv *.jsonl *.vcf"), ("CSV", "*.csv"),
+                       ("JSON Lines", "*.jsonl"), ("vCard", "*.vcf")]
+        )
+        if not filename:
+            return
+
+        try:
+            job = ImportJob(self.store, filename)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to import contacts: {e}")
+            return
+
+        def finished():
+            if isinstance(job.error, ImportCancelled):
+                self.status_var.set("Import cancelled")
+                return
+            if job.error:
+                messagebox.showerror("Error", f"Failed to import contacts: {job.error}")
+                return
+
+            # One commit, one save and one refresh for the whole file
+            report = job.report
+            commit_import(self.store, job.accepted, report)
+            self.save_contacts()
+            self.refresh_contact_list()
+
+            message = f"Imported {report.added} of {report.rows} contacts."
+            if report.rejected:
+                report_file = job.path.with_name(job.path.stem + "_rejected.csv")
+                try:
+                    report.write(report_file)
+                    message += f"\n\n{len(report.rejected)} rows were rejected; see {report_file}"
+                except OSError as e:
+                    message += f"\n\n{len(report.rejected)} rows were rejected (report not saved: {e})"
+            messagebox.showinfo("Import Complete", message)
+            self.status_var.set(f"Imported {report.added} contacts from {job.path.name}")
+
+        self.run_with_progress(job, job.total, "Importing Contacts", finished)
+
+    def find_duplicates(self):
+        """Look for contacts that are probably the same person, in the background"""
+        if self.still_loading():
+            return
+        if self.store.active_count < 2:
+            messagebox.showinfo("Info", "Not enough contacts to compare.")
+            return
+
+        job = DuplicateJob(self.store)
+
+        def finished():
+            if isinstance(job.error, DuplicateSearchCancelled):
+                self.status_var.set("Duplicate search cancelled")
+            elif job.error:
+                messagebox.showerror("Error", f"Failed to look for duplicates: {job.error}")
+            elif not job.pairs:
+                messagebox.showinfo("Find Duplicates", "No likely duplicates found.")
+                self.status_var.set("No duplicates found")
+            else:
+                self.status_var.set(f"Found {len(job.pairs)} possible duplicates")
+                self.show_duplicates(job.pairs)
+
+        self.run_with_progress(job, job.total, "Finding Duplicates", finished)
+
+    def show_duplicates(self, pairs):
+        """Review possible duplicates and merge them one pair at a time"""
+        dup_window = tk.Toplevel(self.root)
+        dup_window.title("Possible Duplicates")
+        dup_window.geometry("900x440")
+        dup_window.transient(self.root)
+
+        main_frame = ttk.Frame(dup_window, padding="15")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.rowconfigure(1, weight=1)
+
+        ttk.Label(main_frame, text="Select a pair and choose which contact to keep. "
+                                   "The other one is deleted after lending it any "
+                                   "email or address the kept one lacks.",
+                  wraplength=840).grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 10))
+
+        def describe(contact):
+            if contact is None or contact.deleted:
+                return "(deleted)"
+            return ", ".join(field for field in (contact.name, contact.phone, contact.email) if field)
+
+        def row_values(pair):
+            return (f"{pair.score:.2f}", describe(self.store.get(pair.first_id)),
+                    describe(self.store.get(pair.second_id)), ", ".join(pair.reasons))
+
+        columns = ("Score", "First", "Second", "Why")
+        dup_list = VirtualTreeview(main_frame, columns, row_values,
+                                   row_key=lambda pair: f"{pair.first_id}-{pair.second_id}", height=14)
+        for column, width in zip(columns, (60, 280, 280, 220)):
+            dup_list.tree.heading(column, text=column)
+            dup_list.tree.column(column, width=width, anchor=tk.E if column == "Score" else tk.W)
+        dup_list.tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        dup_list.v_scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        dup_list.set_rows(list(pairs))
+
+        def selected_pair():
+            key = dup_list.selected_key()
+            if key is None:
+                messagebox.showwarning("Warning", "Please select a pair.", parent=dup_window)
+                return None
+            return next(p for p in dup_list.rows if f"{p.first_id}-{p.second_id}" == key)
+
+        def drop(contact_ids):
+            dup_list.set_rows([p for p in dup_list.rows
+                               if p.first_id not in contact_ids and p.second_id not in contact_ids])
+
+        def merge(keep_first):
+            pair = selected_pair()
+            if pair is None:
+                return
+            first, second = self.store.get(pair.first_id), self.store.get(pair.second_id)
+            if first is None or second is None or first.deleted or second.deleted:
+                # Changed since the search ran
+                messagebox.showinfo("Info", "One of these contacts no longer exists.", parent=dup_window)
+                drop({contact_id for contact_id, contact in ((pair.first_id, first), (pair.second_id, second))
+                      if contact is None or contact.deleted})
+                return
+            keep, other = (first, second) if keep_first else (second, first)
+            merge_duplicate(self.store, keep, other)
+            self.save_contacts()
+            self.refresh_contact_list()
+            drop({other.id})
+            self.status_var.set(f"Merged {other.name} into {keep.name}")
+
+        def not_duplicates():
+            pair = selected_pair()
+            if pair is not None:
+                dup_list.set_rows([p for p in dup_list.rows if p is not pair])
+
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.grid(row=2, column=0, columnspan=2, pady=(10, 0))
+        ttk.Button(btn_frame, text="Keep First",
+                   command=lambda: merge(True)).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Keep Second",
+                   command=lambda: merge(False)).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Not Duplicates",
+                   command=not_duplicates).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Close", command=dup_window.destroy).pack(side=tk.LEFT)
+
+    def run_with_progress(self, job, total, title, on_done):
+        """Start a background job and show its progress until it finishes"""
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title(title)
+        progress_window.geometry("360x130")
+        progress_window.transient(self.root)
+        progress_window.resizable(False, False)
+
+        main_frame = ttk.Frame(progress_window, padding="15")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        label_var = tk.StringVar(value=f"0 of {total}")
+        ttk.Label(main_frame, textvariable=label_var).pack(anchor=tk.W)
+        progress_bar = ttk.Progressbar(main_frame, maximum=max(total, 1), length=320)
+        progress_bar.pack(fill=tk.X, pady=(5, 10))
+        ttk.Button(main_frame, text="Cancel", command=job.cancel).pack()
+        progress_window.protocol("WM_DELETE_WINDOW", job.cancel)
+
+        def poll():
+            progress_bar['value'] = job.processed
+            label_var.set(f"{job.processed} of {total}")
+            if not job.done:
+                self.root.after(100, poll)
+                return
+            progress_window.destroy()
+            on_done()
+
+        job.start()
+        self.status_var.set(f"{title}...")
+        poll()
+
+    def clear_all_contacts(self):
+        """Clear all contacts with confirmation"""
+        if self.still_loading():
+            return
+        active_count = self.store.active_count
+        if active_count == 0:
+            messagebox.showinfo("Info", "No contacts to clear.")
+            return
+
+        if messagebox.askyesno("Confirm Clear All",
+                               f"Are you sure you want to delete all {active_count} contacts?\n\nUse Undo (Ctrl+Z) to bring them back."):
+            self.store.clear()
+            self.save_contacts()
+            self.refresh_contact_list()
+            self.status_var.set(f"All contacts cleared ({active_count} contacts deleted)")
+
+    def undo_key(self, event, action):
+        """Run undo or redo from a shortcut, unless the key was typed into a text field"""
+        if isinstance(event.widget, (tk.Entry, tk.Text)):
+            return
+        action()
+
+    def undo(self):
+        """Revert the last add, edit, delete or clear"""
+        if self.still_loading():
+            return
+        done = self.store.undo()
+        if done is None:
+            self.status_var.set("Nothing to undo")
+            return
+        self.save_contacts()
+        self.refresh_contact_list()
+        self.status_var.set(f"Undone: {done}")
+
+    def redo(self):
+        """Repeat the last undone change"""
+        if self.still_loading():
+            return
+        done = self.store.redo()
+        if done is None:
+            self.status_var.set("Nothing to redo")
+            return
+        self.save_contacts()
+        self.refresh_contact_list()
+        self.status_var.set(f"Redone: {done}")
+
+    def load_contacts(self):
+        """Load contacts from the data file"""
+        try:
+            return self.read_contacts()
+        except Exception as e:
+            return self.load_failed(e)
+
+    @metrics.span("load_contacts")
+    def read_contacts(self):
+        """Read every contact from storage (safe on a worker thread)"""
+        # Don't read while another instance is halfway through a save
+        with self.storage.lock:
+            return self.storage.load()
+
+    def load_failed(self, error):
+        """Start with no contacts after a failed load, reporting odd failures"""
+        if not isinstance(error, (json.JSONDecodeError, FileNotFoundError)):
+            messagebox.showerror("Error", f"Failed to load contacts: {error}")
+        return []
+
+    def save_contacts(self):
+        """Save pending changes to the data file in the background"""
+        if self.store.needs_compaction():
+            # Mostly deleted contacts by now: rewrite the file without them
+            self.compact_storage()
+        else:
+            self.saver.schedule()
+
+    def show_save_error(self, error):
+        messagebox.showerror("Error", f"Failed to save contacts: {error}")
+
+    def show_external_changes(self, count):
+        """Show contacts another instance changed; the indexes are already updated"""
+        self.refresh_contact_list()
+        self.status_var.set(f"Merged {count} change{'s' if count != 1 else ''} from another window")
+
+    def on_close(self):
+        """Write out unsaved changes before the window closes"""
+        if self.saver is not None and not self.saver.flush():
+            if not messagebox.askyesno("Unsaved Changes",
+                                       "Some changes could not be saved.\n\nClose anyway?"):
+                return
+        self.root.destroy()
+
+    def show_statistics(self):
+        """Show totals, contacts added over time and the top email domains"""
+        if self.still_loading():
+            return
+        stats_window = tk.Toplevel(self.root)
+        stats_window.title("Statistics")
+        stats_window.geometry("520x460")
+        stats_window.transient(self.root)
+
+        main_frame = ttk.Frame(stats_window, padding="15")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        main_frame.rowconfigure(2, weight=1)
+
+        totals_var = tk.StringVar()
+        ttk.Label(main_frame, textvariable=totals_var, justify=tk.LEFT).grid(
+            row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 10))
+
+        period = tk.StringVar(value="month")
+        period_frame = ttk.Frame(main_frame)
+        period_frame.grid(row=1, column=0, sticky=tk.W)
+        ttk.Label(period_frame, text="Added per:").pack(side=tk.LEFT)
+        ttk.Label(main_frame, text="Top email domains:").grid(row=1, column=1, sticky=tk.W)
+
+        added_tree = ttk.Treeview(main_frame, columns=("Count",), height=12)
+        added_tree.heading("#0", text="Date")
+        added_tree.heading("Count", text="Added")
+        added_tree.column("#0", width=120)
+        added_tree.column("Count", width=70, anchor=tk.E)
+        added_tree.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 10))
+
+        domain_tree = ttk.Treeview(main_frame, columns=("Count",), height=12)
+        domain_tree.heading("#0", text="Domain")
+        domain_tree.heading("Count", text="Contacts")
+        domain_tree.column("#0", width=150)
+        domain_tree.column("Count", width=70, anchor=tk.E)
+        domain_tree.grid(row=2, column=1, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+        shown = [None]
+
+        def refresh(force=False):
+            if not stats_window.winfo_exists():
+                return
+            # The counters are kept current; only redraw when something changed
+            if force or shown[0] != self.stats.version:
+                shown[0] = self.stats.version
+                stats = self.stats
+                totals_var.set(f"Active contacts: {stats.active}\n"
+                               f"Deleted contacts: {stats.deleted}\n"
+                               f"Without email: {stats.missing_email}\n"
+                               f"Without address: {stats.missing_address}")
+                if period.get() == "day":
+                    added = stats.added_per_day(last=30)
+                else:
+                    added = stats.added_per_month(last=24)
+                added_tree.delete(*added_tree.get_children())
+                for date, count in reversed(added):
+                    added_tree.insert("", tk.END, text=date, values=(count,))
+                domain_tree.delete(*domain_tree.get_children())
+                for domain, count in stats.top_domains(10):
+                    domain_tree.insert("", tk.END, text=domain, values=(count,))
+            if not force:
+                stats_window.after(1000, refresh)
+
+        for value, text in (("month", "Month"), ("day", "Day")):
+            ttk.Radiobutton(period_frame, text=text, variable=period, value=value,
+                            command=lambda: refresh(force=True)).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(main_frame, text="Close", command=stats_window.destroy).grid(
+            row=3, column=0, columnspan=2, pady=(10, 0))
+
+        refresh()
+
+    def show_diagnostics(self):
+        """Show timing and I/O metrics for the instrumented operations"""
+        diag_window = tk.Toplevel(self.root)
+        diag_window.title("Diagnostics")
+        diag_window.geometry("720x360")
+        diag_window.transient(self.root)
+
+        main_frame = ttk.Frame(diag_window, padding="15")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        columns = ("Count", "p50", "p95", "Max", "Read", "Written")
+        tree = ttk.Treeview(main_frame, columns=columns, height=10)
+        tree.heading("#0", text="Operation")
+        tree.heading("Count", text="Calls")
+        tree.heading("p50", text="p50 (ms)")
+        tree.heading("p95", text="p95 (ms)")
+        tree.heading("Max", text="Max (ms)")
+        tree.heading("Read", text="Bytes Read")
+        tree.heading("Written", text="Bytes Written")
+        tree.column("#0", width=170)
+        for column in columns:
+            tree.column(column, width=85, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        def refresh():
+            if not diag_window.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for name, stats in metrics.summary().items():
+                tree.insert("", tk.END, text=name, values=(
+                    stats['count'],
+                    f"{stats['p50_ms']:.2f}",
+                    f"{stats['p95_ms']:.2f}",
+                    f"{stats['max_ms']:.2f}",
+                    stats['bytes_read'],
+                    stats['bytes_written']
+                ))
+            diag_window.after(1000, refresh)
+
+        def toggle_profile():
+            if not metrics.profiling():
+                metrics.start_profile()
+                profile_btn.config(text="Stop Profile")
+                return
+            filename = filedialog.asksaveasfilename(
+                parent=diag_window, title="Save Profile",
+                initialdir=self.data_file.parent, initialfile="contacts.prof",
+                defaultextension=".prof", filetypes=[("cProfile stats", "*.prof")]
+            )
+            if filename:
+                metrics.stop_profile(filename)
+                profile_btn.config(text="Start Profile")
+                self.status_var.set(f"Profile saved to {filename}")
+
+        def save_metrics():
+            filename = filedialog.asksaveasfilename(
+                parent=diag_window, title="Save Metrics",
+                initialdir=self.data_file.parent, initialfile="contacts_metrics.json",
+                defaultextension=".json", filetypes=[("JSON", "*.json")]
+            )
+            if filename:
+                try:
+                    metrics.dump(filename)
+                    self.status_var.set(f"Metrics saved to {filename}")
+                except OSError as e:
+                    messagebox.showerror("Error", f"Failed to save metrics: {e}")
+
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(pady=(10, 0))
+        profile_btn = ttk.Button(btn_frame, command=toggle_profile,
+                                 text="Stop Profile" if metrics.profiling() else "Start Profile")
+        profile_btn.pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Save Metrics", command=save_metrics).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Reset", command=metrics.reset).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="Close", command=diag_window.destroy).pack(side=tk.LEFT)
+
+        refresh()
+
+    def compact_storage(self):
+        """Rewrite the snapshot without deleted contacts that can't be undone"""
+        # Compaction works on the files, so pending writes have to land first
+        if not self.saver.flush():
+            return
+        try:
+            with self.storage.lock:
+                self.saver.sync()
+                self.storage.compact(self.store)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to compact contacts: {e}")
+
+
+def main():
+    if metrics.PROFILE_PATH:
+        metrics.start_profile()
+    root = tk.Tk()
+    app = ContactManager(root)
+    root.mainloop()
+    if metrics.PROFILE_PATH:
+        metrics.stop_profile(metrics.PROFILE_PATH)
+
+
+if __name__ == "__main__":
+    main()
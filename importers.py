@@ -0,0 +1,313 @@
+import csv
+import json
+import threading
+from pathlib import Path
+
+import metrics
+from exporters import batched
+from validation import validate_records
+
+# Rows are validated and deduplicated this many at a time
+CHUNK_SIZE = 5000
+
+# Accepted CSV header names for each field (compared lowercased)
+CSV_ALIASES = {
+    "name": ("name", "full name", "fn"),
+    "phone": ("phone", "phone number", "tel", "telephone", "mobile"),
+    "email": ("email", "email address", "e-mail"),
+    "address": ("address", "adr", "street"),
+    "date_added": ("date_added", "date added"),
+}
+
+REPORT_FIELDS = ["row", "reason", "name", "phone", "email", "address"]
+
+
+class ImportCancelled(Exception):
+    """Raised inside an import when the user cancels it"""
+
+
+class ImportReport:
+    """What happened to each row of an import"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.rows = 0
+        self.added = 0
+        # (row number, reason, fields) for every rejected row
+        self.rejected = []
+
+    def reject(self, row, reason, fields):
+        self.rejected.append((row, reason, fields))
+
+    def write(self, path):
+        """Save the rejected rows as CSV"""
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(REPORT_FIELDS)
+            for row, reason, fields in self.rejected:
+                writer.writerow([row, reason] + [fields.get(k) or "" for k in REPORT_FIELDS[2:]])
+
+
+class ByteCounter:
+    """Iterates decoded lines of a binary file and counts bytes consumed"""
+
+    def __init__(self, f):
+        self.f = f
+        self.bytes_read = 0
+
+    def __iter__(self):
+        first = True
+        for raw in self.f:
+            self.bytes_read += len(raw)
+            # Spreadsheet programs like to start CSV files with a BOM
+            yield raw.decode('utf-8-sig' if first else 'utf-8', errors='replace')
+            first = False
+
+
+def read_csv(lines):
+    """Yield (row number, fields) from CSV lines with a header row"""
+    reader = csv.reader(lines)
+    header = [h.strip().lower() for h in next(reader, [])]
+    columns = {}
+    for field, aliases in CSV_ALIASES.items():
+        for i, name in enumerate(header):
+            if name in aliases:
+                columns[field] = i
+                break
+
+    for row_number, row in enumerate(reader, 2):
+        if not any(cell.strip() for cell in row):
+            continue
+        yield row_number, {field: row[i].strip() if i < len(row) else ""
+                           for field, i in columns.items()}
+
+
+def read_jsonl(lines):
+    """Yield (line number, fields) from JSON Lines"""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            yield line_number, {"_error": "Invalid JSON"}
+            continue
+        if not isinstance(record, dict):
+            yield line_number, {"_error": "Not a JSON object"}
+            continue
+        if record.get('deleted', False):
+            continue
+        yield line_number, {field: str(record.get(field) or "").strip()
+                            for field in ("name", "phone", "email", "address", "date_added")}
+
+
+def read_vcard(lines):
+    """Yield (card number, fields) from vCard 3.0/4.0 text"""
+    card = None
+    card_number = 0
+    for line in unfold_vcard(lines):
+        name, _, value = line.partition(":")
+        prop = name.split(";")[0].split(".")[-1].upper()
+        if prop == "BEGIN" and value.strip().upper() == "VCARD":
+            card = {}
+            card_number += 1
+        elif prop == "END" and card is not None:
+            yield card_number, {field: card.get(field, "")
+                                for field in ("name", "phone", "email", "address")}
+            card = None
+        elif card is None:
+            continue
+        elif prop == "FN":
+            card.setdefault("name", vcard_unescape(value))
+        elif prop == "TEL":
+            phone = vcard_unescape(value)
+            card.setdefault("phone", phone[4:] if phone.lower().startswith("tel:") else phone)
+        elif prop == "EMAIL":
+            card.setdefault("email", vcard_unescape(value))
+        elif prop == "ADR":
+            parts = [vcard_unescape(p) for p in split_unescaped(value, ";")]
+            card.setdefault("address", ", ".join(p for p in parts if p))
+
+
+def unfold_vcard(lines):
+    """Join folded vCard lines (continuations start with a space or tab)"""
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def split_unescaped(value, separator):
+    """Split on ``separator`` where it isn't escaped with a backslash"""
+    parts = []
+    current = []
+    escaped = False
+    for char in value:
+        if escaped:
+            current.append("\\" + char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == separator:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return parts
+
+
+def vcard_unescape(value):
+    """Undo vCard text escaping"""
+    out = []
+    chars = iter(value.strip())
+    for char in chars:
+        if char == "\\":
+            char = next(chars, "")
+            out.append("\n" if char in ("n", "N") else char)
+        else:
+            out.append(char)
+    return "".join(out)
+
+
+# name -> (file extension, reader)
+IMPORT_FORMATS = {
+    "csv": (".csv", read_csv),
+    "jsonl": (".jsonl", read_jsonl),
+    "vcard": (".vcf", read_vcard),
+}
+
+
+def format_for_path(path):
+    """Guess the import format from a file name"""
+    suffix = Path(path).suffix.lower()
+    for name, (extension, _) in IMPORT_FORMATS.items():
+        if extension == suffix:
+            return name
+    raise ValueError(f"Unsupported import file type: {suffix or path}")
+
+
+def check_chunk(chunk, store, seen, report):
+    """Validate one chunk of rows and return the ones that can be added
+
+    Fields are checked by ``validate_records``, so a rejected row gives the
+    same reason as the dialogs and ``app.py validate``. ``seen`` holds
+    normalized phones accepted earlier in the same file, so duplicates are
+    caught by hash lookups against it and the store.
+    """
+    rows = []
+    for row, fields in chunk:
+        if "_error" in fields:
+            report.reject(row, fields["_error"], fields)
+        else:
+            rows.append((row, fields))
+
+    accepted = []
+    # A chunk is too small to be worth sending to other processes
+    results = validate_records([fields for _, fields in rows], workers=0)
+    for (row, fields), result in zip(rows, results):
+        if result.errors:
+            report.reject(row, result.errors[0], fields)
+        elif result.phone in seen or store.find_by_phone(result.phone) is not None:
+            report.reject(row, "Duplicate phone number", fields)
+        else:
+            seen.add(result.phone)
+            accepted.append(fields)
+    return accepted
+
+
+@metrics.span("import")
+def prepare_import(store, path, fmt=None, progress=None, cancelled=None):
+    """Read and validate an import file without changing the store
+
+    Returns ``(accepted, report)``. This is the slow part of an import and
+    is safe to run on a worker thread; ``commit_import`` then adds the
+    accepted rows in one go. ``progress(bytes_read)`` is called per chunk.
+    """
+    path = Path(path)
+    _, reader = IMPORT_FORMATS[fmt or format_for_path(path)]
+    report = ImportReport(path)
+    accepted = []
+    seen = set()
+
+    with open(path, 'rb') as f:
+        lines = ByteCounter(f)
+        for chunk in batched(reader(lines), CHUNK_SIZE):
+            if cancelled and cancelled():
+                raise ImportCancelled()
+            report.rows += len(chunk)
+            accepted.extend(check_chunk(chunk, store, seen, report))
+            if progress:
+                progress(lines.bytes_read)
+    if metrics.ENABLED:
+        metrics.add_bytes("import", read=lines.bytes_read)
+    return accepted, report
+
+
+def commit_import(store, accepted, report):
+    """Add prepared rows to the store; the caller saves once afterwards"""
+    # Contacts may have been added while the file was being read
+    fresh = []
+    for fields in accepted:
+        if store.find_by_phone(fields['phone']) is None:
+            fresh.append(fields)
+        else:
+            report.reject(None, "Duplicate phone number", fields)
+    added = store.add_many(fresh)
+    report.added = len(added)
+    return added
+
+
+def import_contacts(store, path, fmt=None, progress=None, cancelled=None):
+    """Read, validate and add all contacts from a file; returns the report"""
+    accepted, report = prepare_import(store, path, fmt, progress, cancelled)
+    commit_import(store, accepted, report)
+    return report
+
+
+class ImportJob:
+    """Runs ``prepare_import`` on a background thread
+
+    ``processed`` counts bytes read so progress can be shown against the
+    file size. Committing is left to the Tk thread once ``done`` is set.
+    """
+
+    def __init__(self, store, path, fmt=None):
+        self.store = store
+        self.path = Path(path)
+        self.fmt = fmt or format_for_path(path)
+        self.total = self.path.stat().st_size
+        self.processed = 0
+        self.done = False
+        self.error = None
+        self.accepted = None
+        self.report = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _run(self):
+        try:
+            self.accepted, self.report = prepare_import(
+                self.store, self.path, self.fmt,
+                progress=self._progress, cancelled=self._cancel.is_set
+            )
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def _progress(self, bytes_read):
+        self.processed = bytes_read
@@ -0,0 +1,139 @@
+"""Timing spans, byte counters and profiling for the hot paths
+
+Set CONTACT_MANAGER_METRICS=1 to turn metrics on. When it is off, ``span``
+returns the decorated function unchanged and call sites guard byte
+counting with ``if metrics.ENABLED``, so nothing is measured or paid for.
+CONTACT_MANAGER_PROFILE=<file> additionally runs cProfile for the whole
+session and writes the stats to that file on exit.
+"""
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+ENABLED = os.environ.get("CONTACT_MANAGER_METRICS", "").lower() in ("1", "true", "yes")
+PROFILE_PATH = os.environ.get("CONTACT_MANAGER_PROFILE")
+
+# Keep this many recent durations per span for the percentiles
+SAMPLE_LIMIT = 10000
+
+
+class SpanStats:
+    """Counters for one named span"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_LIMIT)
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "max_ms": self.max * 1000,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+
+_spans = {}
+_lock = threading.Lock()
+_profiler = None
+
+
+def _stats(name):
+    stats = _spans.get(name)
+    if stats is None:
+        stats = _spans[name] = SpanStats()
+    return stats
+
+
+def record(name, seconds):
+    """Add one timing to a span"""
+    with _lock:
+        _stats(name).add(seconds)
+
+
+def add_bytes(name, read=0, written=0):
+    """Count bytes read or written under a span's name"""
+    with _lock:
+        stats = _stats(name)
+        stats.bytes_read += read
+        stats.bytes_written += written
+
+
+def span(name):
+    """Decorator that times every call under ``name`` when metrics are on"""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def summary():
+    """Per-span counts, latencies and byte totals, sorted by name"""
+    with _lock:
+        return {name: stats.summary() for name, stats in sorted(_spans.items())}
+
+
+def reset():
+    """Forget everything recorded so far"""
+    with _lock:
+        _spans.clear()
+
+
+def dump(path):
+    """Write the summary to a JSON file"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary(), f, indent=2)
+
+
+def profiling():
+    return _profiler is not None
+
+
+def start_profile():
+    """Start collecting a cProfile profile"""
+    global _profiler
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def stop_profile(path):
+    """Stop profiling and save the stats (readable with pstats)"""
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.disable()
+    _profiler.dump_stats(str(path))
+    _profiler = None
@@ -0,0 +1,223 @@
+import random
+import sys
+from datetime import datetime
+from functools import lru_cache
+
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+# Keys a contact has in contacts.json, in the order they are written
+JSON_FIELDS = ("id", "name", "phone", "email", "address", "date_added", "date_modified", "version",
+               "uid", "deleted")
+_KNOWN_KEYS = frozenset(JSON_FIELDS)
+_intern = sys.intern
+# Seeded from the OS, so uids don't repeat when something seeds the global generator
+_uid_bits = random.Random().getrandbits
+
+
+@lru_cache(maxsize=65536)
+def pack_date(text):
+    """Turn "2024-01-31 09:05" into the integer 202401310905
+
+    Packed dates sort like the strings they came from and take a fraction
+    of the memory. Anything that isn't in DATE_FORMAT is kept unchanged.
+    """
+    if (isinstance(text, str) and len(text) == 16 and text[4] == '-' and text[7] == '-'
+            and text[10] == ' ' and text[13] == ':'):
+        digits = text[0:4] + text[5:7] + text[8:10] + text[11:13] + text[14:16]
+        if digits.isdigit():
+            return int(digits)
+    return text
+
+
+def unpack_date(value):
+    """Inverse of ``pack_date``"""
+    if not isinstance(value, int):
+        return value
+    value, minute = divmod(value, 100)
+    value, hour = divmod(value, 100)
+    value, day = divmod(value, 100)
+    year, month = divmod(value, 100)
+    return f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}"
+
+
+def pack_datetime(moment):
+    """A datetime as a packed date"""
+    return ((((moment.year * 100 + moment.month) * 100 + moment.day) * 100 + moment.hour) * 100
+            + moment.minute)
+
+
+def packed_now():
+    """Current time as a packed date"""
+    return pack_datetime(datetime.now())
+
+
+def new_uid():
+    """Random nonzero 63-bit number for a new contact (fits a SQLite integer)"""
+    return _uid_bits(63) or 1
+
+
+class Contact:
+    """Compact contact record
+
+    Uses ``__slots__`` instead of a per-contact dict, stores the two
+    timestamps as packed integers and interns names and addresses, which
+    repeat a lot in real address books. Keys from contacts.json that the
+    app doesn't know about are kept in ``extra`` so they survive a save.
+
+    Contacts still support ``contact['name']`` and ``contact.get(...)``
+    with the same keys as the JSON, so code written against the old dicts
+    keeps working. Hot paths use the attributes directly.
+
+    ``deleted`` is only ever tested for truth: after a clear it holds the
+    store's ClearedBatch rather than True (see store.py).
+
+    ``version`` counts the changes made to a contact. date_modified only
+    goes down to the minute, so the count is what tells an edit apart from
+    the record it was made to (see ``store.revision``). It is left out of
+    contacts.json while it is 0.
+
+    ``uid`` is a random number a contact gets when it is created and keeps
+    in every copy it is synced to, so two contacts that different copies
+    created under the same id can be told apart (see sync.py). Contacts
+    from before uids have 0.
+    """
+
+    __slots__ = ("id", "name", "phone", "email", "address", "added", "modified", "deleted", "extra",
+                 "version", "uid")
+
+    def __init__(self, id, name, phone, email="", address="", added=None, modified=None,
+                 deleted=False, extra=None, version=0, uid=0):
+        self.id = id
+        self.name = _intern(name)
+        self.phone = phone
+        self.email = email
+        self.address = _intern(address)
+        self.added = added
+        self.modified = modified
+        self.deleted = deleted
+        self.extra = extra
+        self.version = version
+        self.uid = uid
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a contact from its contacts.json representation"""
+        # Called once per contact on load, so fill the slots directly
+        contact = cls.__new__(cls)
+        get = data.get
+        contact.id = get('id')
+        contact.name = _intern(str(get('name') or ""))
+        contact.phone = str(get('phone') or "")
+        contact.email = str(get('email') or "")
+        contact.address = _intern(str(get('address') or ""))
+        contact.added = pack_date(get('date_added'))
+        contact.modified = pack_date(get('date_modified'))
+        contact.deleted = bool(get('deleted', False))
+        contact.version = get('version') or 0
+        contact.uid = get('uid') or 0
+        contact.extra = None
+        if not data.keys() <= _KNOWN_KEYS:
+            contact.extra = {key: value for key, value in data.items() if key not in _KNOWN_KEYS}
+        return contact
+
+    def to_dict(self):
+        """contacts.json representation"""
+        return row_to_dict((self.id, self.name, self.phone, self.email, self.address,
+                            self.added, self.modified, self.deleted, self.extra, self.version,
+                            self.uid))
+
+    @property
+    def date_added(self):
+        return unpack_date(self.added)
+
+    @date_added.setter
+    def date_added(self, value):
+        self.added = pack_date(value)
+
+    @property
+    def date_modified(self):
+        return unpack_date(self.modified)
+
+    @date_modified.setter
+    def date_modified(self, value):
+        self.modified = pack_date(value)
+
+    # Mapping access with the JSON keys
+
+    def __getitem__(self, key):
+        if key in JSON_FIELDS:
+            if key == 'date_modified' and self.modified is None:
+                raise KeyError(key)
+            if key == 'deleted':
+                return bool(self.deleted)
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in JSON_FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"Contact({self.to_dict()!r})"
+
+
+def snapshot(contacts):
+    """Copy contacts as plain tuples, e.g. to write them from another thread
+
+    Much cheaper than building dicts, so it can run on the Tk thread while
+    the serializing happens elsewhere. ``row_to_dict`` turns a row back
+    into the contacts.json representation.
+    """
+    # bool(): a cleared contact's flag could be flipped by an undo meanwhile
+    return [(c.id, c.name, c.phone, c.email, c.address, c.added, c.modified, bool(c.deleted), c.extra,
+             c.version, c.uid) for c in contacts]
+
+
+def row_to_dict(row):
+    """contacts.json representation of a ``snapshot`` row"""
+    contact_id, name, phone, email, address, added, modified, deleted, extra, version, uid = row
+    data = {
+        "id": contact_id,
+        "name": name,
+        "phone": phone,
+        "email": email,
+        "address": address,
+        "date_added": unpack_date(added)
+    }
+    if modified is not None:
+        data['date_modified'] = unpack_date(modified)
+    if version:
+        data['version'] = version
+    if uid:
+        data['uid'] = uid
+    if deleted:
+        data['deleted'] = True
+    if extra:
+        data.update(extra)
+    return data
+
+
+def to_json(obj):
+    """``default`` hook for json.dump so contacts serialize as before"""
+    if isinstance(obj, Contact):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,168 @@
+import queue
+import threading
+
+import metrics
+
+# Collect edits for this long before writing them out together
+SAVE_DELAY_MS = 500
+# How often the Tk thread checks for a finished write
+POLL_MS = 50
+# How often to check whether another instance saved
+WATCH_MS = 2000
+
+
+class BackgroundSaver:
+    """Write-behind persistence for a ContactStore
+
+    ``schedule`` is called after every change. The first call starts a
+    short timer and later calls within that window ride along, so a burst
+    of edits becomes a single write. When the timer fires, the storage
+    engine's ``snapshot`` takes the pending changes on the Tk thread and
+    its ``write`` runs on a worker thread, so the window stays responsive
+    while a large file is written.
+
+    Only one write runs at a time. Changes made meanwhile stay pending in
+    the store and go out with the next write. A write that fails is
+    reported through ``on_error`` and retried before the next one, so no
+    change is dropped. ``flush`` writes everything out before returning;
+    call it before closing the window.
+
+    Other instances may use the same data file. Every write happens under
+    the storage's file lock, after merging whatever the others saved (see
+    ``sync``), and the file is also checked for outside saves every few
+    seconds. ``on_merge(count)`` is called on the Tk thread when that
+    changed any contacts.
+    """
+
+    def __init__(self, root, storage, store, on_error, on_merge=None, delay_ms=SAVE_DELAY_MS):
+        self.root = root
+        self.storage = storage
+        self.store = store
+        self.on_error = on_error
+        self.on_merge = on_merge
+        self.delay_ms = delay_ms
+
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._worker = None
+        self._timer = None
+        self._poller = None
+        self._busy = False
+        # Snapshots not yet written, oldest first
+        self._unwritten = []
+        self._watcher = self.root.after(WATCH_MS, self._watch)
+
+    def schedule(self):
+        """Save the store's changes soon"""
+        if self._timer is None:
+            self._timer = self.root.after(self.delay_ms, self._submit)
+
+    def flush(self):
+        """Write all pending changes now, waiting for a running write
+
+        Returns True when everything is on disk. Errors are passed to
+        ``on_error`` as usual.
+        """
+        if self._timer is not None:
+            self.root.after_cancel(self._timer)
+            self._timer = None
+        if self._busy:
+            if self._poller is not None:
+                self.root.after_cancel(self._poller)
+                self._poller = None
+            self._finish(self._results.get())
+        try:
+            with self.storage.lock:
+                self.sync()
+                self._take_snapshot()
+                self._write_unwritten()
+        except Exception as e:
+            self.on_error(e)
+            return False
+        return True
+
+    def sync(self):
+        """Merge changes other instances saved; the caller holds the lock"""
+        if not self.storage.changed():
+            return
+        records, complete = self.storage.read_changes()
+        count = self.store.merge(records, complete)
+        if count and self.on_merge:
+            self.on_merge(count)
+
+    def _take_snapshot(self):
+        if self.storage.full_snapshots:
+            if self._unwritten or self.store.has_changes():
+                # The newest snapshot holds everything the older ones do
+                self._unwritten = [self.storage.snapshot(self.store)]
+        elif self.store.has_changes():
+            self._unwritten.append(self.storage.snapshot(self.store))
+
+    def _submit(self):
+        self._timer = None
+        if self._busy or not self.storage.lock.acquire(blocking=False):
+            # Try again once the running write (ours or another instance's) is done
+            self.schedule()
+            return
+        try:
+            self.sync()
+            self._take_snapshot()
+        except Exception as e:
+            self.storage.lock.release()
+            self.on_error(e)
+            return
+        if not self._unwritten:
+            self.storage.lock.release()
+            return
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._work, daemon=True)
+            self._worker.start()
+        self._busy = True
+        self._jobs.put(None)
+        if self._poller is None:
+            self._poller = self.root.after(POLL_MS, self._poll)
+
+    def _work(self):
+        while True:
+            self._jobs.get()
+            error = None
+            try:
+                self._write_unwritten()
+            except Exception as e:
+                error = e
+            self._results.put(error)
+
+    @metrics.span("save_contacts")
+    def _write_unwritten(self):
+        # Oldest first: journal appends must stay in order
+        while self._unwritten:
+            self.storage.write(self._unwritten[0])
+            self._unwritten.pop(0)
+
+    def _poll(self):
+        self._poller = None
+        try:
+            error = self._results.get_nowait()
+        except queue.Empty:
+            self._poller = self.root.after(POLL_MS, self._poll)
+            return
+        self._finish(error)
+
+    def _finish(self, error):
+        self._busy = False
+        self.storage.lock.release()
+        if error is not None:
+            self.on_error(error)
+
+    def _watch(self):
+        self._watcher = None
+        if not self._busy and self.storage.changed() and self.storage.lock.acquire(blocking=False):
+            try:
+                self.sync()
+            except Exception as e:
+                # Stop watching rather than report the same error every few seconds
+                self.on_error(e)
+                return
+            finally:
+                self.storage.lock.release()
+        self._watcher = self.root.after(WATCH_MS, self._watch)
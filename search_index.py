@@ -0,0 +1,164 @@
+import threading
+from array import array
+
+# Position of each search option's text in the per-contact tuple
+SEARCH_FIELDS = {"name": 0, "phone": 1, "all": 2}
+
+EMPTY_TEXTS = ("", "", "")
+
+# Refining a previous result is only cheaper than the index while it is small
+REFINE_LIMIT = 5000
+
+
+def contact_matches(contact, term, option):
+    """Whether an active contact is a result of searching for lowercase ``term``
+
+    The same test ``SearchIndex.search`` applies, for a single contact.
+    """
+    if option == "name":
+        return term in contact.name.lower()
+    if option == "phone":
+        return term in contact.phone.lower()
+    return any(term in field.lower() for field in
+               (contact.name, contact.phone, contact.email, contact.address))
+
+
+def trigrams(text):
+    """Set of three-character substrings of ``text``"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """In-memory trigram index over name, phone, email and address
+
+    Every active contact's searchable fields are lowercased once. For each
+    trigram that has been searched for, the index keeps an append-only
+    array of the ids whose text contains it. A search for three or more
+    characters then only checks the contacts in the rarest posting of the
+    term, and a search that extends the previous term rechecks just the
+    previous results.
+
+    Postings are built the first time a trigram is needed rather than up
+    front, so startup stays cheap and memory tracks the grams people
+    actually type. They are never shrunk on edit or delete. Each candidate
+    is checked against its current text, so stale entries cost time but
+    never give wrong results, and postings are dropped once stale entries
+    pile up. After a reload (or undoing a clear) the whole index is
+    rebuilt on the next search rather than straight away.
+
+    Searches may run on a worker thread while the store changes on the Tk
+    thread, so both go through a lock.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._texts = {}
+        self._postings = {}
+        self._stale = 0
+        self._last = None
+        self._lock = threading.RLock()
+        store.subscribe(self._on_change)
+        self.rebuild()
+
+    def rebuild(self):
+        """Index all active contacts from scratch"""
+        self._texts = {}
+        self._postings = {}
+        self._stale = 0
+        self._last = None
+        for contact in self.store.active_contacts():
+            self._add(contact)
+
+    def search(self, term, option):
+        """Return ids of active contacts matching ``term``
+
+        ``option`` is "name", "phone" or "all", matching the search radio
+        buttons. Results are not sorted.
+        """
+        with self._lock:
+            return self._search(term.lower(), option)
+
+    def _search(self, term, option):
+        if self._texts is None:
+            self.rebuild()
+        if not term:
+            return list(self._texts)
+
+        field = SEARCH_FIELDS[option]
+        candidates = self._texts
+        last = self._last
+        if last and last[0] == option and last[1] in term:
+            # The new term contains the previous one, so only its matches can match
+            candidates = last[2]
+        if len(term) >= 3 and len(candidates) > REFINE_LIMIT:
+            candidates = self._candidates(term)
+
+        texts = self._texts
+        ids = [i for i in candidates if term in texts.get(i, EMPTY_TEXTS)[field]]
+        self._last = (option, term, ids)
+        return ids
+
+    def _candidates(self, term):
+        # Ids can appear twice in a posting after an edit
+        return dict.fromkeys(min((self._posting(g) for g in trigrams(term)), key=len))
+
+    def _posting(self, gram):
+        posting = self._postings.get(gram)
+        if posting is None:
+            posting = array('I', [i for i, texts in self._texts.items() if gram in texts[2]])
+            self._postings[gram] = posting
+        return posting
+
+    def _on_change(self, event, contact):
+        with self._lock:
+            self._apply_change(event, contact)
+
+    def _apply_change(self, event, contact):
+        self._last = None
+        if event == "load":
+            # Rebuilt on the next search
+            self._texts = None
+            self._postings = {}
+            self._stale = 0
+        elif self._texts is None:
+            return
+        elif event == "clear":
+            # Every contact is deleted, so there is nothing left to index
+            self._texts = {}
+            self._postings = {}
+            self._stale = 0
+        elif event == "add":
+            self._add(contact)
+        elif event == "update":
+            self._remove(contact.id)
+            if not contact.deleted:
+                self._add(contact)
+        elif event == "delete":
+            self._remove(contact.id)
+
+    def _add(self, contact):
+        name = contact.name.lower()
+        phone = contact.phone.lower()
+        # Join with a character no search term contains so matches stay within a field
+        combined = "\0".join((name, phone,
+                              contact.email.lower(),
+                              contact.address.lower()))
+        contact_id = contact.id
+        self._texts[contact_id] = (name, phone, combined)
+
+        postings = self._postings
+        if postings:
+            for gram in trigrams(combined):
+                posting = postings.get(gram)
+                if posting is not None:
+                    posting.append(contact_id)
+
+    def _remove(self, contact_id):
+        texts = self._texts.pop(contact_id, None)
+        if texts is None:
+            return
+        self._stale += 1
+        if self._stale > max(len(self._texts), 1000):
+            # Postings will be rebuilt on demand without the stale ids
+            self._postings = {}
+            self._stale = 0
@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from collections import deque
+
+# Wait this long after the last keystroke before searching
+DEBOUNCE_MS = 150
+# How often the Tk thread checks for a finished search
+POLL_MS = 15
+
+
+class BackgroundSearch:
+    """Debounced search that runs on a worker thread
+
+    ``request`` restarts a short debounce timer on every keystroke. When it
+    fires, the query is handed to a worker thread. Every request bumps a
+    generation counter: the worker skips queries that are already stale,
+    ``run_query`` can poll ``is_stale`` to give up early, and results from
+    an outdated generation are thrown away. Finished results are picked up
+    on the Tk thread with ``after()``, so Tk is never touched from the
+    worker.
+
+    ``run_query(*args, is_stale=...)`` returns the result, or None if it
+    gave up. ``on_result(result, args, timing)`` runs on the Tk thread.
+    """
+
+    def __init__(self, root, run_query, on_result, delay_ms=DEBOUNCE_MS):
+        self.root = root
+        self.run_query = run_query
+        self.on_result = on_result
+        self.delay_ms = delay_ms
+        self.generation = 0
+        # (args, query_ms, total_ms) for recent searches, newest last
+        self.history = deque(maxlen=200)
+
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._worker = None
+        self._timer = None
+        self._poller = None
+        self._requested_at = None
+        self._outstanding = 0
+
+    def request(self, *args):
+        """Schedule a search for ``args`` once typing pauses"""
+        self.cancel()
+        self._requested_at = time.perf_counter()
+        self._timer = self.root.after(self.delay_ms, self._submit, args)
+
+    def cancel(self):
+        """Drop the pending search and any search still running"""
+        self.generation += 1
+        if self._timer is not None:
+            self.root.after_cancel(self._timer)
+            self._timer = None
+
+    def _submit(self, args):
+        self._timer = None
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._work, daemon=True)
+            self._worker.start()
+        self._jobs.put((self.generation, self._requested_at, args))
+        self._outstanding += 1
+        if self._poller is None:
+            self._poller = self.root.after(POLL_MS, self._poll)
+
+    def _work(self):
+        # Every job gets exactly one reply so the poller knows when to stop
+        while True:
+            generation, requested_at, args = self._jobs.get()
+            result, error, query_ms = None, None, 0.0
+            if generation == self.generation:
+                started = time.perf_counter()
+                try:
+                    result = self.run_query(*args, is_stale=lambda: generation != self.generation)
+                except Exception as e:
+                    error = e
+                query_ms = (time.perf_counter() - started) * 1000
+            self._results.put((generation, requested_at, args, result, error, query_ms))
+
+    def _poll(self):
+        self._poller = None
+        while True:
+            try:
+                generation, requested_at, args, result, error, query_ms = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._outstanding -= 1
+            if generation != self.generation or (result is None and error is None):
+                continue
+            if error is not None:
+                self.root.report_callback_exception(type(error), error, error.__traceback__)
+                continue
+            total_ms = (time.perf_counter() - requested_at) * 1000
+            self.history.append((args, query_ms, total_ms))
+            self.on_result(result, args, {"query_ms": query_ms, "total_ms": total_ms})
+
+        # Keep polling while a query may still be running
+        if self._outstanding:
+            self._poller = self.root.after(POLL_MS, self._poll)
@@ -0,0 +1,395 @@
+"""Local HTTP/JSON API over the contact store
+
+    python app.py serve [--host 127.0.0.1] [--port 8765]
+
+    GET    /contacts                    list: ?sort=name&reverse=1&offset=0&limit=100
+    GET    /contacts?q=smith&by=all     search, same sorting and paging
+    GET    /contacts/<id>
+    POST   /contacts                    {"name": ..., "phone": ..., "email": ..., "address": ...}
+    PUT    /contacts/<id>               same fields; missing ones are left as they are
+    DELETE /contacts/<id>
+
+A list page is ``{"total", "offset", "limit", "contacts"}``. Add
+``stream=1`` (or send ``Accept: application/x-ndjson``) to get every match
+from ``offset`` on as one contact per line instead, sent in chunks so a
+large result never has to be built in memory at once.
+
+Everything runs on one asyncio event loop, like the GUI runs on the Tk
+thread: reads interleave freely, and each change is applied whole before
+the next request is looked at, so writers are serialized and readers
+never see half an edit. Changes are saved by the same BackgroundSaver as
+the window (write-behind, under the shared file lock), so a reply means
+the change is in memory and will be on disk within half a second. Stop
+the server with Ctrl+C to write out anything pending.
+
+Only the standard library is used, so the HTTP side is deliberately
+small: HTTP/1.1 with keep-alive and pipelining, no TLS, and request
+bodies must come with a Content-Length. Bind it to localhost.
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from saver import BackgroundSaver
+from search_index import SearchIndex
+from sort_index import SORT_KEYS, SortedIndex
+from storage import open_storage
+from store import ContactStore
+from validation import contact_error
+
+DEFAULT_PORT = 8765
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Contacts per chunk of a streamed response
+STREAM_BATCH = 500
+MAX_BODY = 64 * 1024
+MAX_HEADERS = 100
+
+REASONS = {
+    200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 411: "Length Required",
+    413: "Payload Too Large", 500: "Internal Server Error",
+}
+FIELDS = ("name", "phone", "email", "address")
+
+
+class HttpError(Exception):
+    """A request failed; sent to the client as ``{"error": message}``"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LoopScheduler:
+    """Tk's ``after``/``after_cancel`` on an asyncio loop, for BackgroundSaver"""
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def after(self, ms, callback, *args):
+        return self.loop.call_later(ms / 1000, callback, *args)
+
+    def after_cancel(self, handle):
+        handle.cancel()
+
+
+class ContactService:
+    """The contact operations behind the HTTP routes, without any HTTP"""
+
+    def __init__(self, storage, store):
+        self.storage = storage
+        self.store = store
+        self.search_index = None if storage.supports_search else SearchIndex(store)
+        self.sort_index = SortedIndex(store)
+        self.saver = None
+
+    def ordered(self, term="", option="name", column="name", reverse=False):
+        """Ids of active contacts matching ``term``, in display order"""
+        ids = None
+        if term:
+            if self.search_index is None:
+                ids = self.storage.search(term, option)
+            else:
+                ids = self.search_index.search(term, option)
+        return self.sort_index.ordered(ids, column, reverse)
+
+    def page(self, term="", option="name", column="name", reverse=False, offset=0, limit=None):
+        """``(total, ids)`` for one page of ``ordered``"""
+        stop = None if limit is None else offset + limit
+        if not term:
+            return self.sort_index.window(column, reverse, offset, stop)
+        ids = self.ordered(term, option, column, reverse)
+        return len(ids), ids[offset:stop]
+
+    def get(self, contact_id):
+        contact = self.store.get(contact_id)
+        if contact is None or contact.deleted:
+            raise HttpError(404, f"No contact with id {contact_id}")
+        return contact
+
+    def create(self, fields):
+        name, phone, email, address = (fields.get(f, "") for f in FIELDS)
+        self._check(name, phone, email)
+        contact = self.store.add(name, phone, email, address)
+        self._changed()
+        return contact
+
+    def update(self, contact_id, fields):
+        contact = self.get(contact_id)
+        name, phone, email, address = (fields.get(f, contact[f]) for f in FIELDS)
+        self._check(name, phone, email, exclude_id=contact.id)
+        self.store.update(contact, name, phone, email, address)
+        self._changed()
+        return contact
+
+    def delete(self, contact_id):
+        self.store.delete(self.get(contact_id))
+        self._changed()
+
+    def _check(self, name, phone, email, exclude_id=None):
+        error = contact_error(name, phone, email)
+        if error:
+            raise HttpError(400, error)
+        if self.store.phone_exists(phone, exclude_id=exclude_id):
+            raise HttpError(409, "A contact with this phone number already exists")
+
+    def _changed(self):
+        if self.saver is None:
+            return
+        if self.store.needs_compaction():
+            self._compact()
+        else:
+            self.saver.schedule()
+
+    def _compact(self):
+        """Rewrite storage without the tombstones, like the window does"""
+        if not self.saver.flush():
+            return
+        with self.storage.lock:
+            self.saver.sync()
+            self.storage.compact(self.store)
+
+
+def parse_fields(body):
+    """Contact fields from a JSON request body, stripped like the form's"""
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise HttpError(400, "Request body is not valid JSON")
+    if not isinstance(data, dict):
+        raise HttpError(400, "Request body must be a JSON object")
+    fields = {}
+    for field in FIELDS:
+        if field in data:
+            value = data[field]
+            if value is None:
+                value = ""
+            if not isinstance(value, str):
+                raise HttpError(400, f"{field} must be a string")
+            fields[field] = value.strip()
+    return fields
+
+
+def int_param(params, name, default, minimum=0, maximum=None):
+    value = params.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise HttpError(400, f"{name} must be a number")
+    if number < minimum:
+        raise HttpError(400, f"{name} must be at least {minimum}")
+    if maximum is not None and number > maximum:
+        raise HttpError(400, f"{name} must be at most {maximum}")
+    return number
+
+
+def encode(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ContactServer:
+    """Minimal HTTP/1.1 front end for a ContactService"""
+
+    def __init__(self, service):
+        self.service = service
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until the client is done"""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body, keep_alive = request
+                try:
+                    await self._dispatch(writer, method, target, headers, body, keep_alive)
+                except HttpError as e:
+                    self._send(writer, e.status, {"error": str(e)}, keep_alive)
+                except Exception as e:
+                    print(f"error: {method} {target}: {e!r}", file=sys.stderr)
+                    self._send(writer, 500, {"error": "Internal server error"}, False)
+                    keep_alive = False
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HttpError as e:
+            # The request itself could not be read; answer and hang up
+            self._send(writer, e.status, {"error": str(e)}, False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # The server is shutting down with this connection idle
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(400, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "transfer-encoding" in headers:
+            raise HttpError(411, "Request bodies need a Content-Length")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(400, "Bad Content-Length")
+        if length > MAX_BODY:
+            raise HttpError(413, "Request body is too large")
+        body = await reader.readexactly(length) if length else b""
+
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            keep_alive = connection == "keep-alive"
+        else:
+            keep_alive = connection != "close"
+        return method.upper(), target, headers, body, keep_alive
+
+    async def _dispatch(self, writer, method, target, headers, body, keep_alive):
+        url = urlsplit(target)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        if not parts or parts[0] != "contacts" or len(parts) > 2:
+            raise HttpError(404, f"No such resource: {url.path}")
+        service = self.service
+
+        if len(parts) == 1:
+            if method == "GET":
+                params = dict(parse_qsl(url.query))
+                await self._list(writer, params, headers, keep_alive)
+            elif method == "POST":
+                contact = service.create(parse_fields(body))
+                self._send(writer, 201, contact.to_dict(), keep_alive)
+            else:
+                raise HttpError(405, f"{method} is not allowed on /contacts")
+            return
+
+        try:
+            contact_id = int(parts[1])
+        except ValueError:
+            raise HttpError(404, f"No contact with id {parts[1]}")
+        if method == "GET":
+            self._send(writer, 200, service.get(contact_id).to_dict(), keep_alive)
+        elif method in ("PUT", "PATCH"):
+            contact = service.update(contact_id, parse_fields(body))
+            self._send(writer, 200, contact.to_dict(), keep_alive)
+        elif method == "DELETE":
+            service.delete(contact_id)
+            self._send(writer, 204, None, keep_alive)
+        else:
+            raise HttpError(405, f"{method} is not allowed on /contacts/<id>")
+
+    async def _list(self, writer, params, headers, keep_alive):
+        column = params.get("sort", "name")
+        if column not in SORT_KEYS:
+            raise HttpError(400, f"sort must be one of {', '.join(SORT_KEYS)}")
+        option = params.get("by", "name")
+        if option not in ("name", "phone", "all"):
+            raise HttpError(400, "by must be one of name, phone, all")
+        reverse = params.get("reverse", "") not in ("", "0", "false")
+        offset = int_param(params, "offset", 0)
+        stream = (params.get("stream", "") not in ("", "0", "false")
+                  or "application/x-ndjson" in headers.get("accept", ""))
+        limit = int_param(params, "limit", None if stream else DEFAULT_LIMIT, 1,
+                          None if stream else MAX_LIMIT)
+
+        term = params.get("q", "").strip().lower()
+        total, ids = self.service.page(term, option, column, reverse, offset, limit)
+        if stream:
+            await self._stream(writer, ids, keep_alive)
+            return
+        contacts = self.service.store.get_many(ids)
+        self._send(writer, 200, {
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "contacts": [c.to_dict() for c in contacts],
+        }, keep_alive)
+
+    async def _stream(self, writer, ids, keep_alive):
+        """Send contacts as chunked NDJSON, yielding to other requests between chunks
+
+        Contacts are looked up as each chunk goes out, so ones deleted
+        in the meantime are left out and edits show up as they are then.
+        """
+        writer.write(self._head(200, "application/x-ndjson", None, keep_alive))
+        get_many = self.service.store.get_many
+        for start in range(0, len(ids), STREAM_BATCH):
+            lines = [encode(c.to_dict()) for c in get_many(ids[start:start + STREAM_BATCH])
+                     if not c.deleted]
+            if lines:
+                chunk = b"\n".join(lines) + b"\n"
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+
+    def _head(self, status, content_type, length, keep_alive):
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+        if content_type:
+            lines.append(f"Content-Type: {content_type}")
+        if length is None:
+            lines.append("Transfer-Encoding: chunked")
+        else:
+            lines.append(f"Content-Length: {length}")
+        lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    def _send(self, writer, status, obj, keep_alive):
+        if obj is None:
+            writer.write(self._head(status, None, 0, keep_alive))
+            return
+        body = encode(obj)
+        writer.write(self._head(status, "application/json; charset=utf-8", len(body), keep_alive)
+                     + body)
+
+
+def report(message):
+    print(message, file=sys.stderr)
+
+
+async def serve(path, mode=None, host="127.0.0.1", port=DEFAULT_PORT, ready=None):
+    """Serve the contacts in ``path`` until cancelled, then save what's pending
+
+    ``ready(server)`` is called once the socket is listening.
+    """
+    path = Path(path)
+    if not path.exists():
+        path.write_text("[]", encoding="utf-8")
+    storage = open_storage(path, mode)
+    with storage.lock:
+        store = ContactStore(storage.load(), next_id=storage.next_id)
+    service = ContactService(storage, store)
+
+    loop = asyncio.get_running_loop()
+    saver = BackgroundSaver(
+        LoopScheduler(loop), storage, store,
+        on_error=lambda e: report(f"error: could not save contacts: {e}"),
+        on_merge=lambda count: report(f"{count} contacts changed in another window"))
+    service.saver = saver
+
+    server = await asyncio.start_server(ContactServer(service).handle, host, port)
+    if ready is not None:
+        ready(server)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        # Nothing else needs the loop any more, so wait for the write here
+        saver.flush()
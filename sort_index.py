@@ -0,0 +1,133 @@
+import threading
+from bisect import bisect_left, insort
+
+from store import normalize_phone
+
+# Sort key for each sortable column; the id comes last so keys are unique
+# and each entry of a sorted list knows which contact it belongs to
+SORT_KEYS = {
+    "name": lambda contact: (contact.name.lower(), contact.id),
+    "phone": lambda contact: (normalize_phone(contact.phone), contact.id),
+    "email": lambda contact: (contact.email.lower(), contact.id),
+    "added": lambda contact: (contact.added if isinstance(contact.added, int) else 0, contact.id),
+}
+# Up to this many buffered changes are moved into a sorted list one by
+# one; more are merged in with a single pass over the list
+PATCH_LIMIT = 500
+
+
+class SortedIndex:
+    """Active contacts kept in order for each sortable column
+
+    Each column holds a sorted list of ``SORT_KEYS`` keys. The keys
+    (lowercased names and so on) are computed once per change rather than
+    on every refresh, and the list is brought up to date on the next
+    lookup: a few changes move single entries with bisect, while a batch
+    (an import, a merge, a sync) is merged in with one pass instead of
+    shifting the list once per contact. A column's list is built the first
+    time it is used, so columns nobody sorts by cost nothing.
+
+    Like SearchIndex, it is read from the search worker thread while the
+    store changes on the Tk thread, so both go through a lock.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._orders = {}
+        self._keys = {}
+        # Per column: id -> the key it has in the sorted list (None if it
+        # isn't there) for contacts changed since the list was updated
+        self._changed = {}
+        self._lock = threading.RLock()
+        store.subscribe(self._on_change)
+
+    def ordered(self, ids=None, column="name", reverse=False):
+        """Return ``ids`` (or all active ids) sorted by ``column``
+
+        Large result sets are read off the sorted list in a single pass;
+        small ones are ordered by their precomputed keys, which is cheaper
+        than walking every contact.
+        """
+        with self._lock:
+            order = self._order(column)
+            if ids is None:
+                result = [key[-1] for key in order]
+            elif len(ids) * 16 < len(order):
+                keys = self._keys[column]
+                result = sorted((i for i in ids if i in keys), key=keys.__getitem__)
+            else:
+                wanted = ids if isinstance(ids, (set, dict)) else set(ids)
+                result = [key[-1] for key in order if key[-1] in wanted]
+        if reverse:
+            result.reverse()
+        return result
+
+    def window(self, column="name", reverse=False, start=0, stop=None):
+        """Active ids from ``start`` to ``stop`` in ``column`` order, and the total
+
+        One page of the full list, without copying the rest of it.
+        """
+        with self._lock:
+            order = self._order(column)
+            total = len(order)
+            if stop is None or stop > total:
+                stop = total
+            if start >= stop:
+                return total, []
+            if reverse:
+                keys = order[total - stop:total - start]
+                keys.reverse()
+            else:
+                keys = order[start:stop]
+        return total, [key[-1] for key in keys]
+
+    def _order(self, column):
+        order = self._orders.get(column)
+        if order is None:
+            sort_key = SORT_KEYS[column]
+            keys = {c.id: sort_key(c) for c in self.store.active_contacts()}
+            order = sorted(keys.values())
+            self._orders[column] = order
+            self._keys[column] = keys
+            self._changed[column] = {}
+        elif self._changed[column]:
+            self._catch_up(order, self._keys[column], self._changed[column])
+        return order
+
+    @staticmethod
+    def _catch_up(order, keys, changed):
+        """Apply the buffered changes to a sorted list in place"""
+        if len(changed) <= PATCH_LIMIT:
+            for contact_id, old in changed.items():
+                if old is not None:
+                    del order[bisect_left(order, old)]
+                key = keys.get(contact_id)
+                if key is not None:
+                    insort(order, key)
+        else:
+            stale = {old for old in changed.values() if old is not None}
+            if stale:
+                order[:] = [key for key in order if key not in stale]
+            order.extend(sorted(keys[i] for i in changed if i in keys))
+            # Two sorted runs, which sort() merges in linear time
+            order.sort()
+        changed.clear()
+
+    def _on_change(self, event, contact):
+        with self._lock:
+            if event in ("load", "clear"):
+                # Rebuilt lazily on the next lookup
+                self._orders = {}
+                self._keys = {}
+                self._changed = {}
+                return
+            contact_id = contact.id
+            active = event != "delete" and not contact.deleted
+            for column, keys in self._keys.items():
+                changed = self._changed[column]
+                if contact_id not in changed:
+                    changed[contact_id] = keys.get(contact_id)
+                if active:
+                    keys[contact_id] = SORT_KEYS[column](contact)
+                else:
+                    keys.pop(contact_id, None)
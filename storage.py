@@ -0,0 +1,790 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+import metrics
+from binary_snapshot import SnapshotReader, encode_snapshot
+from filelock import FileLock
+from records import Contact, row_to_dict, snapshot, to_json, unpack_date
+
+# Replay this many journal records before load() asks for a compaction
+COMPACT_THRESHOLD = 5000
+# Characters read at a time when streaming a JSON list
+STREAM_CHUNK = 1 << 20
+
+_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def clear_records(contacts, date_modified=None):
+    """Soft-delete contact dicts the way ContactStore.clear does
+
+    Each active one gets a new version, and ``date_modified`` if the clear
+    came with one (older journals don't have it).
+    """
+    for contact in contacts:
+        if not contact.get('deleted'):
+            contact['deleted'] = True
+            contact['version'] = contact.get('version', 0) + 1
+            if date_modified:
+                contact['date_modified'] = date_modified
+
+
+def write_atomic(path, write, binary=False):
+    """Replace a file through a temporary file, fsync and rename
+
+    ``write(f)`` fills the temporary file, which is opened in text mode
+    (UTF-8) unless ``binary``. A crash part way through leaves the old
+    file in place instead of a truncated one. Returns the size of the new
+    file.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') if binary else open(tmp_path, 'w', encoding='utf-8') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    size = tmp_path.stat().st_size
+    os.replace(tmp_path, path)
+    fsync_dir(path.parent)
+    return size
+
+
+def iter_json_list(f, chunk_size=STREAM_CHUNK):
+    """Yield the items of the JSON list in text file ``f`` one at a time
+
+    Only a chunk of the file and the item being decoded are held in
+    memory, so this works on lists of any length. The items are expected
+    to be objects, as in contacts.json.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError(f"{getattr(f, 'name', 'file')} does not hold a JSON list")
+    position = 1
+    while True:
+        position = _SEPARATORS.match(buffer, position).end()
+        if position < len(buffer):
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                pass  # Cut off at the end of the chunk; read on
+            else:
+                yield item
+                continue
+        more = f.read(chunk_size)
+        if not more:
+            raise ValueError(f"{getattr(f, 'name', 'file')} ends in the middle of the list")
+        buffer = buffer[position:] + more
+        position = 0
+
+
+def read_json_contacts(path):
+    """Stream the contacts of a contacts.json file as Contact records"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for item in iter_json_list(f):
+            yield Contact.from_dict(item)
+
+
+def file_signature(path):
+    """Cheap fingerprint that changes whenever a file is rewritten"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def fsync_dir(path):
+    """Make a rename in ``path`` durable (not possible on Windows)"""
+    if os.name != 'posix':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class JsonStorage:
+    """Original storage: the whole contact list is rewritten on every save
+
+    Like the other engines, saving is split in two: ``snapshot`` grabs the
+    pending changes on the Tk thread and ``write`` does the I/O, which may
+    happen on a background thread (see saver.py).
+
+    Several instances may share the file. They take turns through ``lock``
+    and notice each other's saves with ``changed``, which only compares
+    the file's size, mtime and inode with what was last read or written.
+    """
+
+    supports_search = False
+    supports_preview = False
+    # Each snapshot is the whole file, so only the newest needs writing
+    full_snapshots = True
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.next_id = 1
+        self.lock = FileLock(self.path)
+        self.signature = None
+
+    def load(self):
+        """Read all contacts from the JSON file"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            contacts = json.load(f)
+            st = os.fstat(f.fileno())
+        self.signature = st.st_ino, st.st_size, st.st_mtime_ns
+        if metrics.ENABLED:
+            metrics.add_bytes("load_contacts", read=self.path.stat().st_size)
+        return contacts
+
+    def save(self, store):
+        """Write every contact (including tombstones) back to the file"""
+        self.write(self.snapshot(store))
+
+    def snapshot(self, store):
+        """Take the pending changes from the store (runs on the Tk thread)"""
+        store.take_changes()
+        return snapshot(store.contacts)
+
+    def write(self, rows):
+        """Replace the file with a snapshot (safe on a worker thread)"""
+        size = write_atomic(self.path, lambda f: json.dump(
+            [row_to_dict(row) for row in rows], f, indent=2, ensure_ascii=False))
+        self.signature = file_signature(self.path)
+        if metrics.ENABLED:
+            metrics.add_bytes("save_contacts", written=size)
+
+    def changed(self):
+        """True if another instance saved since the last load or write"""
+        return file_signature(self.path) != self.signature
+
+    def read_changes(self):
+        """Return ``(contacts, complete)`` saved by other instances
+
+        The whole file has to be read again, so ``complete`` is True: a
+        contact missing from the list no longer exists.
+        """
+        return self.load(), True
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, store):
+        """Rewrite the file without the tombstones the store could purge
+
+        The file has nowhere to keep the id counter, so the contact with the
+        highest id stays even if it is deleted; otherwise its id would be
+        handed out again on the next load.
+        """
+        store.purge_deleted(keep_newest=True)
+        self.save(store)
+
+    def iter_contacts(self):
+        """Stream every stored contact, tombstones included, without a store"""
+        return read_json_contacts(self.path)
+
+
+class JournalStorage:
+    """Snapshot file plus an append-only journal of changes
+
+    contacts.json stays a plain JSON list (the snapshot). Every save appends
+    one line per changed contact to contacts.json.journal, and loading
+    replays those lines on top of the snapshot. Journal records look like::
+
+        {"op": "put", "contact": {...}}
+        {"op": "clear", "date_modified": "2024-01-31 09:05"}
+        {"op": "meta", "next_id": 42}
+
+    ``offset`` is how far into the journal this instance has read or
+    written. When another instance appends, only the lines past it are
+    read (see ``read_changes``).
+    """
+
+    supports_search = False
+    supports_preview = False
+    full_snapshots = False
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.journal_path = journal_path_for(self.path)
+        self.next_id = 1
+        self.journal_records = 0
+        self.lock = FileLock(self.path)
+        self.signature = None
+        self.offset = 0
+
+    def load(self):
+        """Read the snapshot and replay the journal over it"""
+        self.next_id = 1
+        self.journal_records = 0
+        self.offset = 0
+        by_id = self._read_snapshot()
+        self._replay(by_id)
+        return list(by_id.values())
+
+    def _read_snapshot(self):
+        """Contacts in the snapshot file by id; sets ``signature``"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            contacts = json.load(f)
+            st = os.fstat(f.fileno())
+        self.signature = st.st_ino, st.st_size, st.st_mtime_ns
+        if metrics.ENABLED:
+            metrics.add_bytes("load_contacts", read=st.st_size)
+        return {c.get('id'): c for c in contacts}
+
+    def _write_snapshot(self, contacts, next_id):
+        write_atomic(self.path, lambda f: json.dump(contacts, f, indent=2, ensure_ascii=False,
+                                                    default=to_json))
+
+    def _journal(self, offset):
+        """Yield ``(record, line length)`` for the journal lines past ``offset``
+
+        ``record`` is None for a line that isn't valid JSON.
+        """
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A torn write at the end of the journal; the next
+                    # append starts on a fresh line (see ``write``)
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield record, len(line)
+
+    def _replay(self, by_id):
+        """Apply the journal past ``offset`` to ``by_id``; True if it had a clear"""
+        cleared = False
+        for record, size in self._journal(self.offset):
+            self.offset += size
+            if metrics.ENABLED:
+                metrics.add_bytes("load_contacts", read=size)
+            if record is None:
+                continue
+            self.journal_records += 1
+            op = record.get('op')
+            if op == 'put':
+                contact = record['contact']
+                by_id[contact['id']] = contact
+            elif op == 'clear':
+                cleared = True
+                clear_records(by_id.values(), record.get('date_modified'))
+            elif op == 'meta':
+                self.next_id = max(self.next_id, record.get('next_id', 1))
+        return cleared
+
+    def iter_contacts(self):
+        """Stream every stored contact, tombstones included, without a store
+
+        The journal is read first (compaction keeps it short); the snapshot
+        is then streamed with the journal's versions swapped in.
+        """
+        journal = {}
+        cleared = False
+        for record, _ in self._journal(0):
+            op = record and record.get('op')
+            if op == 'put':
+                contact = record['contact']
+                journal[contact['id']] = contact
+            elif op == 'clear':
+                if not cleared:
+                    # The snapshot's contacts are deleted by the first one
+                    cleared = record.get('date_modified') or True
+                clear_records(journal.values(), record.get('date_modified'))
+
+        for contact in self._iter_snapshot():
+            newer = journal.pop(contact.id, None)
+            if newer is not None:
+                yield Contact.from_dict(newer)
+            else:
+                if cleared and not contact.deleted:
+                    contact.deleted = True
+                    contact.version += 1
+                    if cleared is not True:
+                        contact.date_modified = cleared
+                yield contact
+        for contact in journal.values():
+            yield Contact.from_dict(contact)
+
+    def _iter_snapshot(self):
+        return read_json_contacts(self.path)
+
+    def changed(self):
+        """True if another instance saved since the last load or write"""
+        if file_signature(self.path) != self.signature:
+            return True
+        signature = file_signature(self.journal_path)
+        return (signature[1] if signature else 0) != self.offset
+
+    def read_changes(self):
+        """Return ``(contacts, complete)`` saved by other instances
+
+        Normally only the journal lines appended since the last read are
+        parsed. ``complete`` is True when they start with a clear, or when
+        another instance compacted and everything had to be reloaded; a
+        contact missing from the list then no longer exists.
+        """
+        journal = file_signature(self.journal_path)
+        if file_signature(self.path) != self.signature or (journal[1] if journal else 0) < self.offset:
+            return self.load(), True
+        by_id = {}
+        cleared = self._replay(by_id)
+        return list(by_id.values()), cleared
+
+    def save(self, store):
+        """Append the contacts changed since the last save to the journal"""
+        self.write(self.snapshot(store))
+
+    def snapshot(self, store):
+        """Take the pending changes from the store (runs on the Tk thread)"""
+        cleared, changed = store.take_changes()
+        return cleared, [contact.to_dict() for contact in changed]
+
+    def write(self, changes):
+        """Append a snapshot to the journal and fsync it"""
+        cleared, changed = changes
+        lines = []
+        if cleared:
+            lines.append(json.dumps({"op": "clear", "date_modified": unpack_date(cleared)}))
+        for contact in changed:
+            lines.append(json.dumps({"op": "put", "contact": contact}, ensure_ascii=False))
+        if not lines:
+            return
+        data = ("\n".join(lines) + "\n").encode('utf-8')
+        with open(self.journal_path, 'ab') as f:
+            if f.tell() > self.offset:
+                # Finish off a torn line so the new records start cleanly
+                data = b"\n" + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            self.offset = f.tell()
+        self.journal_records += len(lines)
+        if metrics.ENABLED:
+            metrics.add_bytes("save_contacts", written=len(data))
+
+    def needs_compaction(self):
+        """True once the journal has grown past COMPACT_THRESHOLD records"""
+        return self.journal_records > COMPACT_THRESHOLD
+
+    def compact(self, store):
+        """Write a clean snapshot without purged tombstones and reset the journal
+
+        Tombstones the store's undo log still refers to are kept.
+        """
+        store.purge_deleted()
+        store.take_changes()
+        next_id = store.next_id()
+
+        self._write_snapshot(store.contacts, next_id)
+        # Remember the id counter, since the highest ids may have been dropped
+        meta = json.dumps({"op": "meta", "next_id": next_id}) + "\n"
+        write_atomic(self.journal_path, lambda f: f.write(meta))
+
+        self.signature = file_signature(self.path)
+        self.offset = file_signature(self.journal_path)[1]
+        self.journal_records = 1
+
+
+class BinaryStorage(JournalStorage):
+    """Binary snapshot (see binary_snapshot.py) with the same journal as JournalStorage
+
+    The snapshot is read through a memory map instead of the JSON parser,
+    and ``preview`` can show its first screen before anything else is
+    decoded. Saves append to contacts.bin.journal exactly as in journaled
+    mode; the snapshot itself is only rewritten by ``compact``.
+    """
+
+    supports_preview = True
+
+    def _read_snapshot(self):
+        with SnapshotReader(self.path) as reader:
+            contacts = reader.contacts()
+            st = os.fstat(reader.fileno())
+            self.next_id = max(self.next_id, reader.next_id)
+        self.signature = st.st_ino, st.st_size, st.st_mtime_ns
+        if metrics.ENABLED:
+            metrics.add_bytes("load_contacts", read=st.st_size)
+        return {c.id: c for c in contacts}
+
+    def _write_snapshot(self, contacts, next_id):
+        data = encode_snapshot(contacts, next_id)
+        write_atomic(self.path, lambda f: f.write(data), binary=True)
+
+    def _iter_snapshot(self):
+        with SnapshotReader(self.path) as reader:
+            yield from reader
+
+    def preview(self):
+        """Active contacts of the snapshot in name order, decoded as they are read
+
+        Contacts changed since the last compaction are shown as they were
+        then, since the journal isn't applied. ``close()`` the result when
+        done with it.
+        """
+        return SnapshotReader(self.path).by_name()
+
+
+class SqliteStorage:
+    """SQLite database with an FTS5 trigram index over the searchable fields
+
+    Besides load/save, this engine answers searches itself (see ``search``),
+    so filtering runs inside SQLite instead of scanning every contact in
+    Python. Searches can come from a worker thread, so the connection is
+    shared between threads behind a lock.
+
+    SQLite does its own locking between processes; ``changed`` uses
+    ``PRAGMA data_version`` to notice commits from other instances. Every
+    write transaction bumps a counter in the meta table and stamps the
+    rows it touches with it (the ``seq`` column), so ``read_changes`` only
+    has to read the rows stamped after the last value this instance saw.
+    """
+
+    supports_search = True
+    supports_preview = False
+    full_snapshots = False
+
+    SEARCH_COLUMNS = {"name": "name", "phone": "phone", "all": None}
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS contacts (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            email TEXT NOT NULL DEFAULT '',
+            address TEXT NOT NULL DEFAULT '',
+            date_added TEXT,
+            date_modified TEXT,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0,
+            uid INTEGER NOT NULL DEFAULT 0,
+            seq INTEGER NOT NULL DEFAULT 0
+        );
+        -- Lists are ordered by the app's SortedIndex; databases from before
+        -- that carry a name index that only slowed writes down
+        DROP INDEX IF EXISTS contacts_name;
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+        CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+            name, phone, email, address,
+            content='contacts', content_rowid='id', tokenize='trigram'
+        );
+        CREATE TRIGGER IF NOT EXISTS contacts_ai AFTER INSERT ON contacts BEGIN
+            INSERT INTO contacts_fts(rowid, name, phone, email, address)
+            VALUES (new.id, new.name, new.phone, new.email, new.address);
+        END;
+        CREATE TRIGGER IF NOT EXISTS contacts_ad AFTER DELETE ON contacts BEGIN
+            INSERT INTO contacts_fts(contacts_fts, rowid, name, phone, email, address)
+            VALUES ('delete', old.id, old.name, old.phone, old.email, old.address);
+        END;
+        CREATE TRIGGER IF NOT EXISTS contacts_au AFTER UPDATE ON contacts BEGIN
+            INSERT INTO contacts_fts(contacts_fts, rowid, name, phone, email, address)
+            VALUES ('delete', old.id, old.name, old.phone, old.email, old.address);
+            INSERT INTO contacts_fts(rowid, name, phone, email, address)
+            VALUES (new.id, new.name, new.phone, new.email, new.address);
+        END;
+    """
+
+    COLUMNS = "id, name, phone, email, address, date_added, date_modified, deleted, version, uid"
+    SELECT_ALL = f"SELECT {COLUMNS} FROM contacts ORDER BY id"
+    SELECT_SINCE = f"SELECT {COLUMNS} FROM contacts WHERE seq > ?"
+
+    # Rows are stamped with the counter the transaction bumped (see _bump_seq)
+    UPSERT = """
+        INSERT INTO contacts (id, name, phone, email, address, date_added, date_modified, deleted,
+                              version, uid, seq)
+        VALUES (:id, :name, :phone, :email, :address, :date_added, :date_modified, :deleted,
+                :version, :uid, (SELECT value FROM meta WHERE key = 'seq'))
+        ON CONFLICT(id) DO UPDATE SET
+            name = excluded.name, phone = excluded.phone, email = excluded.email,
+            address = excluded.address, date_added = excluded.date_added,
+            date_modified = excluded.date_modified, deleted = excluded.deleted,
+            version = excluded.version, uid = excluded.uid, seq = excluded.seq
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.next_id = 1
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(contacts)")}
+        with self.conn:
+            # Databases from before contacts had a version, a uid or a change stamp
+            for column in ("version", "uid", "seq"):
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE contacts ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS contacts_seq ON contacts(seq)")
+        self._lock = threading.Lock()
+        self.lock = FileLock(self.path)
+        self._data_version = None
+        self._seq = 0
+
+    def load(self):
+        """Read all contacts from the database"""
+        return self._read(self.SELECT_ALL)
+
+    def _read(self, sql, params=()):
+        # One read transaction, so the rows and the counters agree
+        with self.conn:
+            self.conn.execute("BEGIN")
+            contacts = [self._contact_dict(row) for row in self.conn.execute(sql, params)]
+            self.next_id = self._meta("next_id", 1)
+            self._seq = self._meta("seq", 0)
+            self._data_version = self._current_data_version()
+        return contacts
+
+    def _meta(self, key, default):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def iter_contacts(self):
+        """Stream every stored contact, tombstones included, without a store"""
+        for row in self.conn.execute(self.SELECT_ALL):
+            yield Contact.from_dict(self._contact_dict(row))
+
+    @staticmethod
+    def _contact_dict(row):
+        contact = {
+            "id": row[0],
+            "name": row[1],
+            "phone": row[2],
+            "email": row[3],
+            "address": row[4],
+            "date_added": row[5],
+            "date_modified": row[6]
+        }
+        if row[8]:
+            contact['version'] = row[8]
+        if row[9]:
+            contact['uid'] = row[9]
+        if row[7]:
+            contact['deleted'] = True
+        return contact
+
+    def changed(self):
+        """True if another instance committed since the last load"""
+        with self._lock:
+            return self._current_data_version() != self._data_version
+
+    def read_changes(self):
+        """Return ``(contacts, False)``: the rows written since the last read, to merge"""
+        with self._lock:
+            return self._read(self.SELECT_SINCE, (self._seq,)), False
+
+    def _current_data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def save(self, store):
+        """Upsert the contacts changed since the last save in one transaction"""
+        self.write(self.snapshot(store))
+
+    def snapshot(self, store):
+        """Take the pending changes from the store (runs on the Tk thread)"""
+        cleared, changed = store.take_changes()
+        return cleared, [self._row(c) for c in changed], store.next_id()
+
+    def write(self, changes):
+        """Apply a snapshot in one transaction"""
+        cleared, rows, next_id = changes
+        with self._lock, self.conn:
+            # A clear also deletes rows merged in since it was made, which the
+            # store still has as active, so those are read back like anyone else's
+            seq = self._bump_seq(own=not cleared)
+            if cleared:
+                self.conn.execute("UPDATE contacts SET deleted = 1, version = version + 1, "
+                                  "date_modified = ?, seq = ? WHERE deleted = 0",
+                                  (unpack_date(cleared), seq))
+            self.conn.executemany(self.UPSERT, rows)
+            self._set_next_id(next_id)
+
+    def write_all(self, contacts, next_id=1):
+        """Bulk-insert contacts, e.g. when migrating from contacts.json"""
+        with self.conn:
+            self._bump_seq()
+            self.conn.executemany(self.UPSERT, (self._row(c) for c in contacts))
+            self._set_next_id(next_id)
+
+    def _bump_seq(self, own=True):
+        # Incremented before it is read, so the write lock is already held.
+        # Our own rows needn't be read back, unless another instance wrote
+        # since we last looked; then the watermark stays put for its rows
+        self.conn.execute("INSERT INTO meta (key, value) VALUES ('seq', 1) "
+                          "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+        seq = self._meta("seq", 0)
+        if own and seq == self._seq + 1:
+            self._seq = seq
+        return seq
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, store):
+        """Purge the tombstones the store could drop from the database"""
+        purged = store.purge_deleted()
+        store.take_changes()
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM contacts WHERE id = ?", ((i,) for i in purged))
+            self._set_next_id(store.next_id())
+
+    def search(self, term, option):
+        """Return ids of active contacts matching ``term``
+
+        ``option`` is one of "name", "phone" or "all", like the search
+        radio buttons. The trigram index only helps for terms of three or
+        more characters; shorter terms fall back to a scan in SQLite.
+        Results are not sorted; the app orders them with its SortedIndex.
+        """
+        column = self.SEARCH_COLUMNS[option]
+        term = term.lower()
+        if not term:
+            sql = "SELECT id FROM contacts WHERE deleted = 0"
+            params = ()
+        elif len(term) >= 3:
+            phrase = '"' + term.replace('"', '""') + '"'
+            if column:
+                phrase = f"{column} : {phrase}"
+            sql = ("SELECT c.id FROM contacts_fts JOIN contacts c ON c.id = contacts_fts.rowid "
+                   "WHERE contacts_fts MATCH ? AND c.deleted = 0")
+            params = (phrase,)
+        else:
+            columns = [column] if column else ["name", "phone", "email", "address"]
+            where = " OR ".join(f"instr(lower({c}), ?) > 0" for c in columns)
+            sql = f"SELECT id FROM contacts WHERE deleted = 0 AND ({where})"
+            params = (term,) * len(columns)
+        with self._lock:
+            return [row[0] for row in self.conn.execute(sql, params)]
+
+    def _set_next_id(self, next_id):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('next_id', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = max(value, excluded.value)",
+            (next_id,)
+        )
+
+    @staticmethod
+    def _row(contact):
+        return {
+            "id": contact.id,
+            "name": contact.name,
+            "phone": contact.phone,
+            "email": contact.email,
+            "address": contact.address,
+            "date_added": contact.date_added,
+            "date_modified": contact.date_modified if contact.modified is not None else contact.date_added,
+            "deleted": 1 if contact.deleted else 0,
+            "version": contact.version,
+            "uid": contact.uid
+        }
+
+
+def migrate_json_to_sqlite(json_path, db_path=None):
+    """Copy contacts.json (and its journal, if any) into a SQLite database
+
+    Returns the number of contacts copied.
+    """
+    json_path = Path(json_path)
+    source = JournalStorage(json_path) if journal_path_for(json_path).exists() else JsonStorage(json_path)
+    contacts = [Contact.from_dict(c) for c in source.load()]
+    next_id = max(max((c.id or 0 for c in contacts), default=0) + 1, source.next_id)
+
+    target = SqliteStorage(db_path or sqlite_path_for(json_path))
+    try:
+        target.write_all(contacts, next_id)
+    finally:
+        target.conn.close()
+    return len(contacts)
+
+
+def convert_to_binary(json_path, bin_path=None):
+    """Write contacts.json (and its journal, if any) as a binary snapshot
+
+    Returns the number of contacts written.
+    """
+    json_path = Path(json_path)
+    source = JournalStorage(json_path) if journal_path_for(json_path).exists() else JsonStorage(json_path)
+    contacts = [c if isinstance(c, Contact) else Contact.from_dict(c) for c in source.load()]
+    next_id = max(max((c.id or 0 for c in contacts), default=0) + 1, source.next_id)
+    data = encode_snapshot(contacts, next_id)
+    write_atomic(bin_path or binary_path_for(json_path), lambda f: f.write(data), binary=True)
+    return len(contacts)
+
+
+def convert_to_json(bin_path, json_path):
+    """Write a binary snapshot (and its journal, if any) as a contacts.json file
+
+    Deleted contacts are kept, like in contacts.json itself. Returns the
+    number of contacts written.
+    """
+    contacts = BinaryStorage(bin_path).load()
+    write_atomic(json_path, lambda f: json.dump(contacts, f, indent=2, ensure_ascii=False,
+                                                default=to_json))
+    return len(contacts)
+
+
+def default_data_file():
+    """contacts.json next to the program; the GUI and the CLI share it"""
+    return Path(__file__).parent.resolve() / "contacts.json"
+
+
+def journal_path_for(path):
+    """Journal file that belongs to a snapshot file"""
+    path = Path(path)
+    return path.with_name(path.name + ".journal")
+
+
+def sqlite_path_for(path):
+    """SQLite database that sits next to a JSON data file"""
+    return Path(path).with_suffix(".db")
+
+
+def binary_path_for(path):
+    """Binary snapshot that sits next to a JSON data file"""
+    return Path(path).with_suffix(".bin")
+
+
+def open_storage(path, mode=None):
+    """Pick a storage engine for the data file
+
+    ``mode`` defaults to the CONTACT_MANAGER_STORAGE environment variable,
+    or to "sqlite" or "binary" when a database or binary snapshot already
+    exists next to the data file. An existing journal always selects
+    journaled mode over plain JSON so its records are not silently
+    ignored. The first time SQLite or binary mode is used, the JSON data
+    is copied into the new file.
+    """
+    path = Path(path)
+    mode = mode or os.environ.get("CONTACT_MANAGER_STORAGE")
+    if not mode:
+        if sqlite_path_for(path).exists():
+            mode = "sqlite"
+        elif binary_path_for(path).exists():
+            mode = "binary"
+        else:
+            mode = "json"
+
+    if mode == "sqlite":
+        db_path = sqlite_path_for(path)
+        if not db_path.exists() and path.exists():
+            migrate_json_to_sqlite(path, db_path)
+        return SqliteStorage(db_path)
+    if mode == "binary":
+        bin_path = binary_path_for(path)
+        if not bin_path.exists() and path.exists():
+            convert_to_binary(path, bin_path)
+        return BinaryStorage(bin_path)
+    if mode == "journal" or journal_path_for(path).exists():
+        return JournalStorage(path)
+    if mode == "json":
+        return JsonStorage(path)
+    raise ValueError(f"Unknown storage mode: {mode}")
@@ -0,0 +1,702 @@
+import gc
+from datetime import datetime, timedelta
+
+from records import Contact, new_uid, pack_date, pack_datetime, packed_now
+from validation import normalize_phone
+
+# Operations that can be undone; older ones are forgotten
+UNDO_LIMIT = 100
+# Tombstones tolerated before compaction is due, even in a small list
+COMPACT_MIN = 1000
+# Deleted contacts are kept at least this long, so that copies syncing
+# within that time learn about the deletion instead of bringing them back
+TOMBSTONE_DAYS = 90
+# Low bits of a revision that hold the contact's version
+VERSION_BITS = 24
+VERSION_MASK = (1 << VERSION_BITS) - 1
+
+
+def revision(contact):
+    """Comparable last change of a contact: its date, then its version
+
+    Dates only go down to the minute, so within a minute the contact that
+    was changed more often counts as the later one. An edit therefore
+    always beats the record it was made to.
+    """
+    stamp = contact.modified if contact.modified is not None else contact.added
+    stamp = stamp if isinstance(stamp, int) else 0
+    return stamp << VERSION_BITS | min(contact.version, VERSION_MASK)
+
+
+def _fields(contact):
+    return (contact.name, contact.phone, contact.email, contact.address,
+            contact.added, contact.modified, bool(contact.deleted), contact.extra, contact.version,
+            contact.uid)
+
+
+def _bump(contacts, now):
+    """Count a change to contacts that a batch flip deleted or restored"""
+    for contact in contacts:
+        contact.version += 1
+        contact.modified = now
+
+
+def _describe(entry):
+    """What an undo log entry did, for the status bar"""
+    kind, target = entry[0], entry[1]
+    if kind == "group":
+        return entry[2]
+    if kind == "add":
+        return f"adding {target[0].name}" if len(target) == 1 else f"adding {len(target)} contacts"
+    if kind == "update":
+        return f"editing {target.name}"
+    if kind == "delete":
+        return f"deleting {target.name}"
+    return f"clearing {len(target.contacts)} contacts"
+
+
+class ClearedBatch:
+    """The contacts one ``clear`` deleted; stands in for ``deleted = True``
+
+    ``clear`` sets the ``deleted`` of every active contact to the batch
+    instead of True. The batch is true while the clear is in effect, so
+    ``if contact.deleted`` works unchanged, and undoing or redoing the
+    clear flips all of its contacts at once. The phone index and active
+    count from before the clear are kept to be swapped back in.
+    """
+
+    __slots__ = ("in_effect", "contacts", "by_phone", "active_count", "merges", "intact", "expired")
+
+    def __init__(self, by_phone, active_count, merges):
+        self.in_effect = True
+        self.contacts = []
+        self.by_phone = by_phone
+        self.active_count = active_count
+        # The saved index only matches the contacts while no merge came in
+        # (ContactStore._merges is unchanged) and none of the batch's
+        # contacts was changed on its own
+        self.merges = merges
+        self.intact = True
+        # Out of the undo log: its tombstones may be purged
+        self.expired = False
+
+    def __bool__(self):
+        return self.in_effect
+
+    def __repr__(self):
+        return f"ClearedBatch({len(self.contacts or ())} contacts, in_effect={self.in_effect})"
+
+
+def _flatten(entries):
+    """Undo log entries with groups replaced by their parts"""
+    for entry in entries:
+        if entry[0] == "group":
+            yield from entry[1]
+        else:
+            yield entry
+
+
+class UndoGroup:
+    """What ``ContactStore.group`` returns; collects log entries while open"""
+
+    def __init__(self, store, description):
+        self.store = store
+        self.description = description
+        self.outer = False
+
+    def __enter__(self):
+        # Nested groups simply add to the outermost one
+        self.outer = self.store._group is None
+        if self.outer:
+            self.store._group = []
+        return self
+
+    def __exit__(self, *exc):
+        if self.outer:
+            entries = self.store._group
+            self.store._group = None
+            if len(entries) == 1:
+                self.store._record(entries[0])
+            elif entries:
+                self.store._record(("group", entries, self.description))
+
+
+class ContactStore:
+    """Contact collection with hash indexes on id and phone (no Tk dependency)
+
+    Contacts are kept as compact ``Contact`` records (see records.py) that
+    serialize back to the dicts in contacts.json. Soft-deleted contacts
+    stay in ``self.contacts`` but are dropped from the phone index.
+
+    Other indexes can follow changes with ``subscribe``. Listeners are
+    called as ``callback(event, contact)`` where event is one of "add",
+    "update", "delete", "clear" or "load" (the last two pass None).
+
+    Adds, edits, deletes and clears are recorded in an undo log of the
+    last UNDO_LIMIT operations (see ``undo`` and ``redo``); ``group``
+    makes several of them one step. Clearing is a single entry that undo reverts without visiting each contact (see
+    ClearedBatch). Tombstones stay in the store while the log may still
+    bring them back; ``purge_deleted`` drops the rest, and storage
+    compaction calls it once ``needs_compaction`` says they pile up.
+    """
+
+    def __init__(self, contacts=None, next_id=1):
+        self.contacts = []
+        self._by_id = {}
+        self._by_phone = {}
+        self._next_id = 1
+        self._active_count = 0
+        self._dirty = {}
+        self._new = set()
+        self._cleared = False
+        self._listeners = []
+        self._undo = []
+        self._redo = []
+        # Entries of an open ``group``, or None
+        self._group = None
+        # Undone clears whose contacts have to be saved as active again
+        self._restored = []
+        # Redone clears whose contacts storage deletes with the next clear
+        self._recleared = []
+        # Counts merges, which change contacts behind the undo log's back
+        self._merges = 0
+        # Tombstones the undo log still needed at the last purge
+        self._tombstones_kept = 0
+        self.load(contacts or [], next_id)
+
+    def load(self, contacts, next_id=1):
+        """Replace the contents of the store and rebuild the indexes
+
+        ``contacts`` may be Contact records or dicts as read from JSON.
+        ``next_id`` keeps ids monotonic when the highest ids were purged
+        from storage along with their tombstones.
+        """
+        self.contacts = []
+        self._by_id = {}
+        self._by_phone = {}
+        self._active_count = 0
+        self._dirty = {}
+        self._new = set()
+        self._cleared = False
+        self._undo = []
+        self._redo = []
+        self._group = None
+        self._restored = []
+        self._recleared = []
+        self._tombstones_kept = 0
+        # Records are tracked by the garbage collector (the plain dicts from
+        # json aren't), so pause it instead of rescanning them while loading
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            contacts = [c if isinstance(c, Contact) else Contact.from_dict(c) for c in contacts]
+            self._next_id = max(max((c.id or 0 for c in contacts), default=0) + 1, next_id)
+
+            for contact in contacts:
+                if not contact.id:
+                    # Older files may contain contacts without an id
+                    contact.id = self._take_id()
+                self.contacts.append(contact)
+                self._by_id[contact.id] = contact
+                if not contact.deleted:
+                    self._index(contact)
+        finally:
+            if collecting:
+                gc.enable()
+        self._notify("load", None)
+
+    def subscribe(self, callback):
+        """Call ``callback(event, contact)`` after every change"""
+        self._listeners.append(callback)
+
+    @property
+    def active_count(self):
+        """Number of contacts that are not soft-deleted"""
+        return self._active_count
+
+    def active_contacts(self):
+        """Iterate over contacts that are not soft-deleted"""
+        return (c for c in self.contacts if not c.deleted)
+
+    def get(self, contact_id):
+        """Look up a contact by id, or None"""
+        return self._by_id.get(contact_id)
+
+    def get_many(self, contact_ids):
+        """Look up contacts by id, in order, skipping unknown ids"""
+        return [c for c in map(self._by_id.get, contact_ids) if c is not None]
+
+    def find_by_phone(self, phone):
+        """Return the active contact with this phone number, or None"""
+        return self._by_phone.get(normalize_phone(phone))
+
+    def phone_exists(self, phone, exclude_id=None):
+        """Check whether another active contact already uses this phone"""
+        contact = self.find_by_phone(phone)
+        return contact is not None and contact.id != exclude_id
+
+    def next_id(self):
+        """Id that the next added contact will get"""
+        return self._next_id
+
+    def reserve_id(self):
+        """Take a new id for a contact that is about to be merged in"""
+        return self._take_id()
+
+    def has_changes(self):
+        """Whether anything changed since the last ``take_changes``"""
+        return bool(self._cleared or self._dirty or self._restored or self._recleared)
+
+    def take_changes(self):
+        """Return and reset the changes made since the last call
+
+        The result is ``(cleared, contacts)``: if everything was
+        soft-deleted, the packed time of the clear (else False), followed by
+        the contacts touched after that. A clear bumps the version of every
+        contact it deletes, and storage has to do the same.
+        """
+        changed = list(self._dirty.values())
+        for batch in self._recleared:
+            if batch.contacts is not None:
+                _bump([c for c in batch.contacts if c.deleted is batch], self._cleared)
+        for batch in self._restored:
+            if not batch:
+                restored = [c for c in batch.contacts if c.deleted is batch and c.id not in self._dirty]
+                _bump(restored, packed_now())
+                changed.extend(restored)
+        for batch in self._restored + self._recleared:
+            if batch.expired:
+                batch.contacts = None
+        changes = (self._cleared, changed)
+        self._restored = []
+        self._recleared = []
+        self._dirty = {}
+        self._new = set()
+        self._cleared = False
+        return changes
+
+    def add(self, name, phone, email="", address=""):
+        """Create a new contact and return it"""
+        now = packed_now()
+        contact = Contact(self._take_id(), name, phone, email, address, now, now, uid=new_uid())
+        self.contacts.append(contact)
+        self._by_id[contact.id] = contact
+        self._index(contact)
+        self._dirty[contact.id] = contact
+        self._new.add(contact.id)
+        self._notify("add", contact)
+        self._record(("add", [contact]))
+        return contact
+
+    def add_many(self, records):
+        """Create contacts from dicts with name/phone/email/address
+
+        Used for bulk imports: all contacts share one timestamp, and a
+        ``date_added`` already present on a record is kept.
+        """
+        now = packed_now()
+        added = []
+        for record in records:
+            contact = Contact(
+                self._take_id(),
+                record['name'],
+                record['phone'],
+                record.get('email') or "",
+                record.get('address') or "",
+                pack_date(record.get('date_added')) or now,
+                now,
+                uid=new_uid()
+            )
+            self.contacts.append(contact)
+            self._by_id[contact.id] = contact
+            self._index(contact)
+            self._dirty[contact.id] = contact
+            self._new.add(contact.id)
+            self._notify("add", contact)
+            added.append(contact)
+        if added:
+            self._record(("add", added))
+        return added
+
+    def update(self, contact, name, phone, email, address):
+        """Change the fields of an existing contact"""
+        self._record(("update", contact, (contact.name, contact.phone, contact.email, contact.address),
+                      (name, phone, email, address)))
+        return self._set_fields(contact, name, phone, email, address)
+
+    def _set_fields(self, contact, name, phone, email, address):
+        self._detach(contact)
+        if not contact.deleted:
+            self._unindex(contact)
+        contact.name = name
+        contact.phone = phone
+        contact.email = email
+        contact.address = address
+        contact.modified = packed_now()
+        contact.version += 1
+        if not contact.deleted:
+            self._index(contact)
+        self._dirty[contact.id] = contact
+        self._notify("update", contact)
+        return contact
+
+    def delete(self, contact):
+        """Soft-delete a contact"""
+        if contact.deleted:
+            return
+        self._record(("delete", contact))
+        self._soft_delete(contact)
+
+    def _soft_delete(self, contact):
+        if contact.deleted:
+            return
+        self._detach(contact)
+        self._unindex(contact)
+        contact.deleted = True
+        contact.modified = packed_now()
+        contact.version += 1
+        self._dirty[contact.id] = contact
+        self._notify("delete", contact)
+
+    def _undelete(self, contact):
+        if not contact.deleted:
+            return
+        self._detach(contact)
+        contact.deleted = False
+        contact.modified = packed_now()
+        contact.version += 1
+        self._index(contact)
+        self._dirty[contact.id] = contact
+        self._notify("add", contact)
+
+    def clear(self):
+        """Soft-delete every contact and return how many were active"""
+        cleared = self._active_count
+        batch = ClearedBatch(self._by_phone, self._active_count, self._merges)
+        self._clear(batch)
+        # New contacts needn't be saved just to be deleted; edited ones
+        # still are, or storage would keep their old fields and version
+        self._dirty = {i: c for i, c in self._dirty.items() if i not in self._new}
+        if cleared:
+            self._record(("clear", batch))
+        return cleared
+
+    def _clear(self, batch):
+        now = packed_now()
+        contacts = batch.contacts = []
+        restored = self._restored
+        for contact in self.contacts:
+            deleted = contact.deleted
+            if not deleted:
+                # A contact restored by an undo that was never saved is
+                # still deleted in storage, so it doesn't change there
+                if deleted is False or deleted not in restored:
+                    contact.version += 1
+                    contact.modified = now
+                contact.deleted = batch
+                contacts.append(contact)
+        batch.in_effect = True
+        batch.intact = True
+        # Cleared for real now, so a pending restore or redo of it is moot
+        for pending in (self._restored, self._recleared):
+            if batch in pending:
+                pending.remove(batch)
+        self._by_phone = {}
+        self._active_count = 0
+        self._cleared = now
+        self._notify("clear", None)
+
+    @staticmethod
+    def _detach(contact):
+        """Note that a contact changes apart from the clear it may belong to"""
+        batch = contact.deleted
+        if batch is not True and batch is not False:
+            batch.intact = False
+
+    def _unclear(self, batch):
+        """Undo a clear: its contacts come back by flipping the batch"""
+        batch.in_effect = False
+        if batch.intact and batch.merges == self._merges and self._active_count == 0:
+            # Nothing else changed the contacts since, so the index from
+            # before the clear is still right
+            self._by_phone = batch.by_phone
+            self._active_count = batch.active_count
+        else:
+            self._reindex()
+            batch.active_count = self._active_count
+            # Other contacts may be active now too, so redo has to look
+            batch.intact = False
+        batch.by_phone = None
+        batch.merges = self._merges
+        if batch not in self._restored:
+            self._restored.append(batch)
+        self._notify("load", None)
+
+    def _reclear(self, batch):
+        """Redo a clear"""
+        if batch.intact and batch.merges == self._merges and \
+                self._active_count == batch.active_count:
+            batch.by_phone = self._by_phone
+            batch.in_effect = True
+            if batch in self._restored:
+                # The undo was never saved, so storage still has the clear
+                self._restored.remove(batch)
+            else:
+                self._recleared.append(batch)
+                self._cleared = packed_now()
+            self._by_phone = {}
+            self._active_count = 0
+            self._notify("clear", None)
+        else:
+            # Merges changed which contacts are active; clear them for real
+            batch.by_phone = self._by_phone
+            batch.active_count = self._active_count
+            batch.merges = self._merges
+            self._clear(batch)
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self):
+        """Revert the last operation; returns what it was, or None if there is none
+
+        The result reads like "deleting Ann Lee", for a status message.
+        Reverting is a change of its own: it is saved like any other and
+        gets a new date_modified, so other copies take it too.
+        """
+        if not self._undo:
+            return None
+        entry = self._undo.pop()
+        self._revert(entry)
+        self._redo.append(entry)
+        return _describe(entry)
+
+    def redo(self):
+        """Repeat the last undone operation; returns what it was, or None"""
+        if not self._redo:
+            return None
+        entry = self._redo.pop()
+        self._repeat(entry)
+        self._undo.append(entry)
+        return _describe(entry)
+
+    def group(self, description):
+        """Make the changes inside ``with store.group(...)`` a single undo step
+
+        ``description`` is what ``undo`` and ``redo`` report for the step,
+        e.g. "merging Ann Lee into Ann Smith".
+        """
+        return UndoGroup(self, description)
+
+    def _revert(self, entry):
+        kind = entry[0]
+        if kind == "group":
+            for part in reversed(entry[1]):
+                self._revert(part)
+        elif kind == "add":
+            for contact in reversed(entry[1]):
+                self._soft_delete(contact)
+        elif kind == "update":
+            self._set_fields(entry[1], *entry[2])
+        elif kind == "delete":
+            self._undelete(entry[1])
+        else:
+            self._unclear(entry[1])
+
+    def _repeat(self, entry):
+        kind = entry[0]
+        if kind == "group":
+            for part in entry[1]:
+                self._repeat(part)
+        elif kind == "add":
+            for contact in entry[1]:
+                self._undelete(contact)
+        elif kind == "update":
+            self._set_fields(entry[1], *entry[3])
+        elif kind == "delete":
+            self._soft_delete(entry[1])
+        else:
+            self._reclear(entry[1])
+
+    def needs_compaction(self):
+        """Whether more tombstones than live contacts piled up since the last purge"""
+        tombstones = len(self.contacts) - self._active_count - self._tombstones_kept
+        return tombstones > max(COMPACT_MIN, self._active_count)
+
+    def purge_deleted(self, keep_newest=False, keep_days=TOMBSTONE_DAYS):
+        """Drop tombstones the undo log can't bring back; returns their ids
+
+        The storage engine has to remove the same ids (see its
+        ``compact``). Deleted contacts that an entry in the log refers to
+        are kept until the entry is forgotten, and those deleted in the
+        last ``keep_days`` days are kept for sync (see sync.py). With
+        ``keep_newest`` the contact with the highest id stays too, for
+        storage that has no other way to remember ``next_id``.
+        """
+        recent = pack_datetime(datetime.now() - timedelta(days=keep_days)) << VERSION_BITS
+        keep = set()
+        if keep_newest and self._by_id:
+            keep.add(max(self._by_id))
+        for entry in _flatten(self._undo + self._redo):
+            if entry[0] == "add":
+                keep.update(contact.id for contact in entry[1])
+            elif entry[0] != "clear":
+                keep.add(entry[1].id)
+        contacts = []
+        purged = []
+        for contact in self.contacts:
+            deleted = contact.deleted
+            if deleted and (deleted is True or deleted.expired) and contact.id not in keep \
+                    and revision(contact) < recent:
+                purged.append(contact.id)
+                del self._by_id[contact.id]
+                self._dirty.pop(contact.id, None)
+            else:
+                contacts.append(contact)
+        self.contacts = contacts
+        self._tombstones_kept = len(contacts) - self._active_count
+        return purged
+
+    def _record(self, entry):
+        for undone in self._redo:
+            self._forget(undone)
+        self._redo = []
+        if self._group is not None:
+            self._group.append(entry)
+            return
+        self._undo.append(entry)
+        if len(self._undo) > UNDO_LIMIT:
+            self._forget(self._undo.pop(0))
+
+    def _forget(self, entry):
+        """Let go of a log entry that can no longer be undone or redone"""
+        if entry[0] == "group":
+            for part in entry[1]:
+                self._forget(part)
+        elif entry[0] == "clear":
+            batch = entry[1]
+            batch.expired = True
+            batch.by_phone = None
+            if batch:
+                # Its tombstones count towards the next compaction again
+                self._tombstones_kept = max(0, self._tombstones_kept - len(batch.contacts))
+            if (batch or batch not in self._restored) and batch not in self._recleared:
+                # A flipped clear still waiting to be saved keeps its list
+                # until ``take_changes``
+                batch.contacts = None
+
+    def merge(self, records, complete=False, save=False):
+        """Bring in contacts saved by another instance; returns how many changed
+
+        ``records`` are Contact records or dicts as read from storage. A record replaces the
+        local contact with the same id unless that contact has unsaved
+        changes that are at least as recent (by date_modified), in which
+        case the local edit wins and is saved over it later. If both sides
+        created a contact with the same id, the local one gets a new id.
+
+        With ``complete``, ``records`` is everything in storage, so clean
+        local contacts that are missing from it were deleted elsewhere.
+
+        Merged contacts are not marked as changed, since they came from
+        storage, unless ``save`` is set (for records from another file, see
+        sync.py). Listeners get one event per contact instead of a reload.
+        """
+        changed = 0
+        incoming = [r if isinstance(r, Contact) else Contact.from_dict(r) for r in records]
+        if incoming or complete:
+            self._merges += 1
+        self._next_id = max(max((c.id or 0 for c in incoming), default=0) + 1, self._next_id)
+
+        seen = set()
+        for contact in incoming:
+            seen.add(contact.id)
+            local = self._by_id.get(contact.id)
+            if local is not None and contact.id in self._dirty:
+                if contact.id in self._new and contact.uid != local.uid:
+                    # Both sides used this id for a new contact; move ours
+                    if not local.deleted:
+                        self._notify("delete", local)
+                    del self._by_id[local.id]
+                    del self._dirty[local.id]
+                    self._new.discard(local.id)
+                    local.id = self._take_id()
+                    self._by_id[local.id] = local
+                    self._dirty[local.id] = local
+                    self._new.add(local.id)
+                    if not local.deleted:
+                        self._notify("add", local)
+                    local = None
+                elif revision(local) >= revision(contact):
+                    continue
+                else:
+                    del self._dirty[contact.id]
+
+            if local is None:
+                self.contacts.append(contact)
+                self._by_id[contact.id] = contact
+                if save:
+                    self._dirty[contact.id] = contact
+                if not contact.deleted:
+                    self._index(contact)
+                    self._notify("add", contact)
+                    changed += 1
+            elif _fields(local) != _fields(contact):
+                self._replace(local, contact)
+                if save:
+                    self._dirty[local.id] = local
+                changed += 1
+
+        if complete:
+            for local in self.contacts:
+                if local.id not in seen and not local.deleted and local.id not in self._dirty:
+                    self._unindex(local)
+                    local.deleted = True
+                    self._notify("delete", local)
+                    changed += 1
+        return changed
+
+    def _replace(self, local, contact):
+        if not local.deleted:
+            self._unindex(local)
+        local.name = contact.name
+        local.phone = contact.phone
+        local.email = contact.email
+        local.address = contact.address
+        local.added = contact.added
+        local.modified = contact.modified
+        local.deleted = contact.deleted
+        local.extra = contact.extra
+        local.version = contact.version
+        local.uid = contact.uid
+        if not local.deleted:
+            self._index(local)
+        self._notify("update", local)
+
+    def _notify(self, event, contact):
+        for callback in self._listeners:
+            callback(event, contact)
+
+    def _take_id(self):
+        contact_id = self._next_id
+        self._next_id += 1
+        return contact_id
+
+    def _reindex(self):
+        self._by_phone = {}
+        self._active_count = 0
+        for contact in self.contacts:
+            if not contact.deleted:
+                self._index(contact)
+
+    def _index(self, contact):
+        self._by_phone[normalize_phone(contact.phone)] = contact
+        self._active_count += 1
+
+    def _unindex(self, contact):
+        key = normalize_phone(contact.phone)
+        if self._by_phone.get(key) is contact:
+            del self._by_phone[key]
+        self._active_count -= 1
@@ -0,0 +1,338 @@
+"""Keeping copies of the contact list in step
+
+Every contact is fingerprinted by its id, its identity (see
+``identity``), a hash of its content and its revision (date_modified, or
+date_added if it was never edited, followed by the contact's version,
+which every change bumps). To bring site B up to date with site A, only
+two small files have to travel:
+
+    B: python app.py sync-fingerprint b.fp            28 bytes per contact
+    A: python app.py sync-diff b.fp changes.jsonl.gz  what B is missing
+    B: python app.py sync-apply changes.jsonl.gz
+
+``diff`` streams A's contacts once and looks each one up in B's
+fingerprints, which are kept as sorted arrays rather than a dict, so
+memory stays at about 28 bytes per contact of B and nothing of A is held.
+When both files are at hand, ``python app.py sync OTHER`` does all of it
+in one pass over OTHER.
+
+The higher revision wins a conflict, so an edit always beats the record
+it was made to, even within the same minute. Only edits made on both
+sides in the same minute, as many times over, fall back to the higher
+hash, so both directions agree on the outcome. Deletions travel as
+tombstones, which compaction keeps for store.TOMBSTONE_DAYS; a copy
+that hasn't synced for longer than that can bring a purged contact back.
+A contact that one side doesn't have at all is never taken as deleted.
+
+Each site hands out ids on its own, so both may create a contact with the
+same next id. Contacts are therefore matched by identity rather than id,
+and one that arrives under an id used for another contact here gets a new
+id (and keeps it: later syncs find it by identity).
+"""
+import gzip
+import json
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+
+from records import Contact
+from storage import write_atomic
+from store import revision
+
+MAGIC = b"CMFP"
+# 2: revisions include the contact's version; 3: identities
+VERSION = 3
+# magic, version, reserved, count; then the id, identity, hash and revision arrays
+HEADER = struct.Struct("<4sHHI")
+CHANGESET_HEADER = {"format": "contact-changeset", "version": 1}
+# Winning contacts are merged into the store this many at a time
+APPLY_CHUNK = 5000
+_EXTRA_ENCODER = json.JSONEncoder(ensure_ascii=False, sort_keys=True)
+
+
+def content_hash(contact):
+    """64-bit hash of everything about a contact except its id and revision
+
+    date_modified is left out so that a contact that was never edited
+    (no date_modified in JSON, the same as date_added in SQLite) hashes
+    the same in every storage mode.
+    """
+    data = "\0".join((contact.name, contact.phone, contact.email, contact.address,
+                      str(contact.added), "1" if contact.deleted else "0"))
+    if contact.extra:
+        data += "\0" + _EXTRA_ENCODER.encode(contact.extra)
+    return int.from_bytes(blake2b(data.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def identity(contact):
+    """Number that tells a contact apart from others given the same id elsewhere
+
+    That is the contact's uid. Contacts from before uids get one derived
+    from their id and date_added, which is what used to tell them apart,
+    so every copy derives the same.
+    """
+    if contact.uid:
+        return contact.uid
+    data = f"{contact.id}\0{contact.added}".encode("utf-8")
+    # 63 bits, like new_uid, so it can be stored as the contact's uid
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), "little") >> 1
+
+
+def same_contact(a, b):
+    """Whether two contacts with the same id have the same identity"""
+    if a.uid or b.uid:
+        return identity(a) == identity(b)
+    # Saves hashing both
+    return a.added == b.added
+
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class Fingerprints:
+    """Ids, identities, content hashes and revisions of one copy, sorted by id"""
+
+    def __init__(self, ids, uids, hashes, revisions):
+        self.ids = ids
+        self.uids = uids
+        self.hashes = hashes
+        self.revisions = revisions
+        # Identities sorted, and where each one is; built by find_uid
+        self._sorted_uids = None
+        self._uid_positions = None
+
+    @classmethod
+    def build(cls, contacts):
+        """Fingerprint a stream of Contact records"""
+        ids, uids, hashes, revisions = array("I"), array("Q"), array("Q"), array("q")
+        in_order = True
+        last = -1
+        for contact in contacts:
+            if contact.id <= last:
+                in_order = False
+            last = contact.id
+            ids.append(contact.id)
+            uids.append(identity(contact))
+            hashes.append(content_hash(contact))
+            revisions.append(revision(contact))
+        if not in_order:
+            order = sorted(range(len(ids)), key=ids.__getitem__)
+            ids = array("I", map(ids.__getitem__, order))
+            uids = array("Q", map(uids.__getitem__, order))
+            hashes = array("Q", map(hashes.__getitem__, order))
+            revisions = array("q", map(revisions.__getitem__, order))
+        return cls(ids, uids, hashes, revisions)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            magic, version, _, count = HEADER.unpack_from(data)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a contact fingerprint file (or from a newer version)")
+        ids, uids, hashes, revisions = array("I"), array("Q"), array("Q"), array("q")
+        position = HEADER.size
+        for values in (ids, uids, hashes, revisions):
+            end = position + values.itemsize * count
+            values.frombytes(data[position:end])
+            _little_endian(values)
+            position = end
+        if len(revisions) != count:
+            raise ValueError(f"{path} is truncated")
+        return cls(ids, uids, hashes, revisions)
+
+    def save(self, path):
+        def write(f):
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(self.ids)))
+            for values in (self.ids, self.uids, self.hashes, self.revisions):
+                f.write(_little_endian(array(values.typecode, values)).tobytes())
+        return write_atomic(path, write, binary=True)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def find(self, contact_id):
+        """Position of ``contact_id`` in the arrays, or -1"""
+        i = bisect_left(self.ids, contact_id)
+        return i if i < len(self.ids) and self.ids[i] == contact_id else -1
+
+    def find_uid(self, uid):
+        """Position of the contact with identity ``uid`` in the arrays, or -1"""
+        if self._sorted_uids is None:
+            # Only needed for contacts the ids don't match up, so built lazily
+            order = sorted(range(len(self.uids)), key=self.uids.__getitem__)
+            self._sorted_uids = array("Q", map(self.uids.__getitem__, order))
+            self._uid_positions = array("I", order)
+        i = bisect_left(self._sorted_uids, uid)
+        if i < len(self._sorted_uids) and self._sorted_uids[i] == uid:
+            return self._uid_positions[i]
+        return -1
+
+
+def change_kind(contact, known):
+    """What taking ``contact`` does to a copy: "add", "update" or "delete"
+
+    ``known`` is whether the copy already has the contact, under any id.
+    """
+    if contact.deleted:
+        return "delete"
+    return "update" if known else "add"
+
+
+def diff(contacts, fingerprints):
+    """Yield ``(kind, contact)`` for each contact the other copy should take
+
+    ``contacts`` is a stream of this copy's Contact records and
+    ``fingerprints`` the other copy's.
+    """
+    ids, uids = fingerprints.ids, fingerprints.uids
+    # Both sides are usually in id order, so try the next fingerprint
+    # before searching for it
+    following = 0
+    for contact in contacts:
+        if following < len(ids) and ids[following] == contact.id:
+            i = following
+        else:
+            i = fingerprints.find(contact.id)
+        uid = identity(contact)
+        if i >= 0 and uids[i] == uid:
+            following = i + 1
+        else:
+            # Not there, or there under another id
+            i = fingerprints.find_uid(uid)
+            if i < 0:
+                yield change_kind(contact, False), contact
+                continue
+        digest = content_hash(contact)
+        if digest != fingerprints.hashes[i] and \
+                (revision(contact), digest) > (fingerprints.revisions[i], fingerprints.hashes[i]):
+            yield change_kind(contact, True), contact
+
+
+def write_changeset(path, changes):
+    """Write ``(kind, contact)`` pairs as a changeset; returns the count per kind
+
+    A changeset is JSON Lines: a header, then one contact per line as in
+    contacts.json. It is gzipped if ``path`` ends in .gz.
+    """
+    counts = {"add": 0, "update": 0, "delete": 0}
+
+    def write(f):
+        out = gzip.GzipFile(fileobj=f, mode="wb", mtime=0) if str(path).endswith(".gz") else f
+        out.write((json.dumps(CHANGESET_HEADER) + "\n").encode("utf-8"))
+        for kind, contact in changes:
+            counts[kind] += 1
+            out.write((json.dumps(contact.to_dict(), ensure_ascii=False) + "\n").encode("utf-8"))
+        if out is not f:
+            out.close()
+
+    write_atomic(path, write, binary=True)
+    return counts
+
+
+def read_changeset(path):
+    """Stream the contacts of a changeset (gzipped or not)"""
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    with gzip.open(path, "rb") if gzipped else open(path, "rb") as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            header = None
+        if header != CHANGESET_HEADER:
+            raise ValueError(f"{path} is not a contact changeset (or from a newer version)")
+        for line in f:
+            if line.strip():
+                yield Contact.from_dict(json.loads(line))
+
+
+class SyncReport:
+    """What ``apply_changes`` did"""
+
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+        # (id in the other copy, new id) of contacts whose id was taken here
+        self.renumbered = []
+
+    def summary(self):
+        message = (f"{self.added} added, {self.updated} updated, {self.deleted} deleted, "
+                   f"{self.unchanged} unchanged")
+        if self.renumbered:
+            shown = ", ".join(f"{old} as {new}" for old, new in self.renumbered[:10])
+            more = "..." if len(self.renumbered) > 10 else ""
+            message += (f"; {len(self.renumbered)} took new ids, theirs being used here: "
+                        f"{shown}{more}")
+        return message
+
+
+def apply_changes(store, contacts):
+    """Merge contacts from another copy into ``store``; returns a SyncReport
+
+    ``contacts`` can be a changeset or the other copy in full. A contact
+    replaces the local one with the same identity only if it wins by
+    revision (see the module docstring). One whose id is used for another
+    contact here is added under a new id. Winners are merged APPLY_CHUNK
+    at a time as the stream goes by, and saved by the next save.
+    """
+    report = SyncReport()
+    winners = []
+    renumber = []
+    by_uid = None
+    for contact in contacts:
+        local = store.get(contact.id)
+        if local is None or not same_contact(local, contact):
+            uid = identity(contact)
+            if by_uid is None:
+                # Only needed once ids stop matching up
+                by_uid = {identity(c): c for c in store.contacts}
+            taken = local is not None
+            local = by_uid.get(uid)
+            if local is not None or taken:
+                # The identity has to travel with the contact to its id here
+                contact.uid = uid
+                if local is not None:
+                    contact.id = local.id
+                else:
+                    # New ids are handed out at the end, once every id
+                    # this stream brings in is taken
+                    renumber.append(contact)
+                    report.added += 1
+                    continue
+        if local is not None:
+            digest = content_hash(contact)
+            local_digest = content_hash(local)
+            if digest == local_digest or \
+                    (revision(contact), digest) < (revision(local), local_digest):
+                report.unchanged += 1
+                continue
+        kind = change_kind(contact, local is not None)
+        if kind == "add":
+            report.added += 1
+        elif kind == "update":
+            report.updated += 1
+        else:
+            report.deleted += 1
+        winners.append(contact)
+        if len(winners) >= APPLY_CHUNK:
+            store.merge(winners, save=True)
+            winners = []
+    if winners:
+        store.merge(winners, save=True)
+    for contact in renumber:
+        new_id = store.reserve_id()
+        report.renumbered.append((contact.id, new_id))
+        contact.id = new_id
+    if renumber:
+        store.merge(renumber, save=True)
+    return report
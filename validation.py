@@ -0,0 +1,198 @@
+"""Field rules for contacts, one at a time or in batches
+
+``validate_records`` checks many records at once (an existing file after
+the rules change, or a large import) and also returns each record's
+fields normalized. It works through the records in chunks; big inputs are
+spread over a process pool, one chunk per task, since the checks are pure
+CPU work that threads can't run in parallel.
+"""
+import os
+import re
+from collections import deque
+from itertools import islice
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+NON_DIGITS = re.compile(r'\D')
+MIN_PHONE_DIGITS = 10
+
+# Records per chunk (and per task sent to a worker process)
+CHUNK_SIZE = 20000
+# Fewer records than this are checked in this process; starting workers
+# and sending them the records costs more than it saves
+PARALLEL_MIN = 200000
+# Chunks queued in the pool per worker; the rest of the input is only read
+# as results are taken
+CHUNKS_PER_WORKER = 2
+
+
+def normalize_phone(phone):
+    """Reduce a phone number to its digits so formatting doesn't matter"""
+    return NON_DIGITS.sub('', str(phone or ''))
+
+
+def normalize_email(email):
+    """Strip an email address and lowercase its domain"""
+    email = (email or '').strip()
+    local, at, domain = email.rpartition('@')
+    return local + at + domain.lower() if at else email
+
+
+def normalize_text(text):
+    """Collapse runs of whitespace in a name or address"""
+    return ' '.join((text or '').split())
+
+
+def validate_email(email):
+    """Validate email format"""
+    if not email:
+        return True  # Email is optional
+    return EMAIL_PATTERN.match(email) is not None
+
+
+def validate_phone(phone):
+    """Validate phone number format"""
+    if not phone:
+        return False
+    return len(NON_DIGITS.sub('', phone)) >= MIN_PHONE_DIGITS
+
+
+def contact_errors(name, phone, email):
+    """Every problem with a contact's fields, as messages"""
+    errors = []
+    if not name:
+        errors.append("Name is required")
+    if not phone:
+        errors.append("Phone number is required")
+    elif not validate_phone(phone):
+        errors.append("Please enter a valid phone number")
+    if email and not validate_email(email):
+        errors.append("Please enter a valid email address")
+    return errors
+
+
+def contact_error(name, phone, email):
+    """First problem with a contact's fields as a message, or None"""
+    errors = contact_errors(name, phone, email)
+    return errors[0] if errors else None
+
+
+class RecordResult:
+    """Outcome for one record of ``validate_records``
+
+    ``index`` is the record's position in the input. ``phone`` is reduced
+    to its digits, ``email`` stripped with a lowercase domain, and
+    ``name`` and ``address`` have their whitespace collapsed.
+    """
+
+    __slots__ = ("index", "errors", "name", "phone", "email", "address")
+
+    def __init__(self, index, errors, name, phone, email, address):
+        self.index = index
+        self.errors = errors
+        self.name = name
+        self.phone = phone
+        self.email = email
+        self.address = address
+
+    @property
+    def valid(self):
+        return not self.errors
+
+    def __repr__(self):
+        return f"RecordResult({self.index}, {self.errors!r})"
+
+
+def _fields(record):
+    """``(name, phone, email, address)`` of a Contact, dict or such a tuple"""
+    if isinstance(record, tuple):
+        return record
+    if isinstance(record, dict):
+        get = record.get
+        return get('name'), get('phone'), get('email'), get('address')
+    return record.name, record.phone, record.email, record.address
+
+
+def check_rows(rows):
+    """Normalize and validate ``(name, phone, email, address)`` tuples
+
+    Returns ``(errors, name, phone digits, email, address)`` per row. This
+    is what each worker process runs, so it only deals in plain tuples.
+    """
+    results = []
+    append = results.append
+    non_digits = NON_DIGITS.sub
+    email_match = EMAIL_PATTERN.match
+    for name, phone, email, address in rows:
+        name = ' '.join(name.split()) if name else ''
+        phone = str(phone).strip() if phone else ''
+        digits = non_digits('', phone)
+        email = normalize_email(email) if email else ''
+        # The same rules as contact_errors, which is only asked for the
+        # messages when something is wrong
+        if name and len(digits) >= MIN_PHONE_DIGITS and (not email or email_match(email)):
+            errors = ()
+        else:
+            errors = tuple(contact_errors(name, phone, email))
+        append((errors, name, digits, email, ' '.join(address.split()) if address else ''))
+    return results
+
+
+def _chunks(records, chunk_size):
+    records = iter(records)
+    while True:
+        chunk = [_fields(record) for record in islice(records, chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def _check_in_pool(pool, chunks, limit):
+    # Results in input order, with at most ``limit`` chunks submitted ahead
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(check_rows, chunk))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def validate_records(records, workers=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Check many records, yielding a RecordResult for each, in input order
+
+    ``records`` can be Contact records, dicts with the contact keys or
+    ``(name, phone, email, address)`` tuples. ``workers`` is the number of
+    processes to use: None picks one per CPU when there are at least
+    PARALLEL_MIN records (only known for sized inputs), and 0 or 1 keeps
+    the work in this process. ``progress(n)`` is called with the number
+    of records done after each chunk.
+    """
+    if workers is None:
+        try:
+            large = len(records) >= PARALLEL_MIN
+        except TypeError:
+            large = False
+        workers = (os.cpu_count() or 1) if large else 0
+
+    chunks = _chunks(records, chunk_size)
+    pool = None
+    if workers > 1:
+        # Loaded here: it pulls in multiprocessing, which every start of
+        # the app would pay for otherwise
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(workers)
+    try:
+        if pool:
+            checked = _check_in_pool(pool, chunks, workers * CHUNKS_PER_WORKER)
+        else:
+            checked = map(check_rows, chunks)
+        index = 0
+        for results in checked:
+            for result in results:
+                yield RecordResult(index, *result)
+                index += 1
+            if progress:
+                progress(index)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
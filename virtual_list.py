@@ -0,0 +1,181 @@
+import tkinter as tk
+from tkinter import ttk
+
+# Row height used when the theme doesn't report one
+DEFAULT_ROW_HEIGHT = 20
+
+
+class VirtualTreeview:
+    """Treeview that only holds widget rows for the visible window
+
+    The full result list lives in ``self.rows``. The Treeview itself only
+    ever contains enough items to fill its visible height (plus one partly
+    visible row), and those items are refilled from ``self.rows`` as the
+    user scrolls. Render cost therefore depends on the window height, not
+    on how many contacts matched.
+
+    Items are keyed by ``row_key(row)``, so a render only inserts, moves,
+    updates or deletes the items that actually changed, and the selection
+    follows its row across refreshes and scrolling.
+    """
+
+    def __init__(self, parent, columns, row_values, row_key, height=18):
+        self.row_values = row_values
+        self.row_key = row_key
+        self.rows = []
+        self.offset = 0
+        self.page_size = height + 1
+        self._shown = {}
+        self._selected = None
+
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", height=height)
+        self.v_scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+
+        style_height = ttk.Style().lookup("Treeview", "rowheight")
+        self.row_height = int(style_height) if style_height else DEFAULT_ROW_HEIGHT
+
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_by(3))
+        self.tree.bind('<Up>', lambda e: self._on_arrow(-1))
+        self.tree.bind('<Down>', lambda e: self._on_arrow(1))
+        self.tree.bind('<Prior>', lambda e: self._scroll_by(-self.visible_rows()))
+        self.tree.bind('<Next>', lambda e: self._scroll_by(self.visible_rows()))
+
+    def set_rows(self, rows, contains=None):
+        """Show a new result list, keeping the scroll position if possible
+
+        ``contains(key)`` tells whether the row with ``key`` (a string) is
+        among ``rows``, so keeping the selection doesn't have to scan a
+        long list; without it the rows are searched.
+        """
+        self._remember_selection()
+        if self._selected is not None:
+            if contains is not None:
+                present = contains(self._selected)
+            else:
+                present = any(str(self.row_key(row)) == self._selected for row in rows)
+            if not present:
+                self._selected = None
+        self.rows = rows
+        self.offset = self._clamp(self.offset)
+        self.render()
+
+    def visible_rows(self):
+        """Number of rows that fit completely in the widget"""
+        return max(1, self.page_size - 1)
+
+    def selected_key(self):
+        """Key (as a string) of the selected row, or None
+
+        The selection is remembered while its row is scrolled out of view.
+        """
+        self._remember_selection()
+        return self._selected
+
+    def render(self):
+        """Bring the Treeview items in line with the current window of rows"""
+        window = self.rows[self.offset:self.offset + self.page_size]
+        keys = [str(self.row_key(row)) for row in window]
+
+        wanted = set(keys)
+        stale = [iid for iid in self.tree.get_children() if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self._shown[iid]
+
+        for index, (iid, row) in enumerate(zip(keys, window)):
+            values = self.row_values(row)
+            shown = self._shown.get(iid)
+            if shown is None:
+                self.tree.insert("", index, iid=iid, values=values)
+            else:
+                if self.tree.index(iid) != index:
+                    self.tree.move(iid, "", index)
+                if shown != values:
+                    self.tree.item(iid, values=values)
+            self._shown[iid] = values
+
+        if self._selected in self._shown and self.tree.selection() != (self._selected,):
+            self.tree.selection_set(self._selected)
+        self._update_scrollbar()
+
+    def yview(self, *args):
+        """Scrollbar command: ``moveto fraction`` or ``scroll n units|pages``"""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self.visible_rows()
+            self._scroll_by(amount)
+
+    def _remember_selection(self):
+        selection = self.tree.selection()
+        if selection:
+            self._selected = selection[0]
+        elif self._selected in self._shown:
+            # It is on screen but no longer selected, so it was deselected
+            self._selected = None
+
+    def _scroll_by(self, amount):
+        self._scroll_to(self.offset + amount)
+        return "break"
+
+    def _scroll_to(self, offset):
+        offset = self._clamp(offset)
+        if offset != self.offset:
+            self._remember_selection()
+            self.offset = offset
+            self.render()
+
+    def _clamp(self, offset):
+        return max(0, min(offset, len(self.rows) - self.visible_rows()))
+
+    def _update_scrollbar(self):
+        total = len(self.rows)
+        if total <= self.visible_rows():
+            self.v_scrollbar.set(0, 1)
+        else:
+            self.v_scrollbar.set(self.offset / total,
+                                 min(1, (self.offset + self.visible_rows()) / total))
+
+    def _on_resize(self, event):
+        page_size = max(1, event.height // self.row_height) + 1
+        if page_size != self.page_size:
+            self._remember_selection()
+            self.page_size = page_size
+            self.offset = self._clamp(self.offset)
+            self.render()
+
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        steps = int(event.delta / 120) or (1 if event.delta > 0 else -1)
+        return self._scroll_by(-3 * steps)
+
+    def _on_arrow(self, direction):
+        items = self.tree.get_children()
+        selection = self.tree.selection()
+        if not items or not selection:
+            return None
+        position = self.tree.index(selection[0])
+        at_edge = (position == 0) if direction < 0 else (position >= self.visible_rows() - 1)
+        if not at_edge:
+            return None
+
+        # Keep the selection on the edge row and move the window instead
+        offset = self.offset
+        self._scroll_by(direction)
+        if self.offset == offset:
+            return None
+        items = self.tree.get_children()
+        if items:
+            item = items[min(position, len(items) - 1)]
+            self._selected = item
+            self.tree.selection_set(item)
+            self.tree.focus(item)
+        return "break"